@@ -0,0 +1,209 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from metrics import ADMISSION_REJECTIONS
+
+# Route class per path; unlisted paths (/profile, /cities, /cities/{id}, ...) are cheap and never queued
+ROUTE_CLASSES = {
+    "/token": "auth",
+    "/users/": "auth",
+    "/filter_cities": "catalog",
+    "/populate_cities": "catalog",
+    "/cities/search": "catalog",
+    "/cities/facets": "catalog",
+    "/cities/rank": "catalog",
+    "/cities/nearest": "catalog",
+    "/cities/within": "catalog",
+    "/cities/in_bounds": "catalog",
+    "/cities/export": "export",
+    "/plans/export": "export",
+    "/plans/optimize": "catalog",
+    "/plans": "warehouse",
+    "/profile/preferences": "warehouse",
+}
+
+# Route class -> (requests running at once, requests allowed to wait, longest wait in seconds)
+ADMISSION_BUDGETS = {
+    "auth": (16, 32, 2.0),
+    "catalog": (16, 64, 1.0),
+    "export": (4, 8, 5.0),
+    "warehouse": (16, 64, 3.0),
+}
+
+WAREHOUSE_RATE_LIMIT = float(os.environ.get("WAREHOUSE_RATE_LIMIT", "5"))
+WAREHOUSE_RATE_BURST = int(os.environ.get("WAREHOUSE_RATE_BURST", "20"))
+
+# Route class -> (tokens per second, burst) for each user; a rate of 0 turns the limit off
+RATE_LIMITS = {
+    "warehouse": (WAREHOUSE_RATE_LIMIT, WAREHOUSE_RATE_BURST),
+} if WAREHOUSE_RATE_LIMIT > 0 else {}
+RATE_LIMIT_USERS = 10_000
+
+# Weight of the latest request in the per-class service time average
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyBudget:
+    """At most ``limit`` requests at once; up to ``queue`` more wait in FIFO order for ``max_wait`` seconds.
+
+    A request is turned away on arrival when the queue is full, or when the
+    expected wait (queue position times the average service time) is already
+    beyond ``max_wait``, instead of timing out after waiting.
+    """
+
+    def __init__(self, limit: int, queue: int, max_wait: float):
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.service_seconds = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def expected_wait(self) -> float:
+        return (len(self._waiters) // self.limit + 1) * self.service_seconds
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue:
+            raise Rejected(503, "queue_full", self.expected_wait())
+        expected = self.expected_wait()
+        if expected > self.max_wait:
+            raise Rejected(503, "deadline", expected)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Rejected(503, "timeout", self.expected_wait())
+
+    def release(self, seconds: Optional[float] = None):
+        if seconds is not None:
+            self.service_seconds += SERVICE_TIME_SMOOTHING * (seconds - self.service_seconds)
+        if self._waiters:
+            # The slot moves straight to the next waiter; active stays the same
+            self._waiters.popleft().set_result(None)
+            return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"active": self.active, "waiting": len(self._waiters), "service_seconds": self.service_seconds}
+
+
+class TokenBuckets:
+    """Per-user token buckets, LRU-bounded; a user's bucket refills at ``rate`` up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int, max_users: int = RATE_LIMIT_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, user: str):
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(user, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens < 1:
+            self._buckets[user] = (tokens, now)
+            raise Rejected(429, "rate_limited", (1 - tokens) / self.rate)
+        self._buckets[user] = (tokens - 1, now)
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+
+
+class AdmissionController:
+    """Per-route-class concurrency budgets and per-user rate limits.
+
+    ``identify`` maps a request scope to the user it acts for (None when
+    anonymous); anonymous requests are rate limited by client address.
+    """
+
+    def __init__(
+        self,
+        identify: Callable[[dict], Optional[str]],
+        classes: Optional[Dict[str, str]] = None,
+        budgets: Optional[Dict[str, Tuple[int, int, float]]] = None,
+        rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+    ):
+        self.identify = identify
+        self.classes = dict(ROUTE_CLASSES if classes is None else classes)
+        self.budgets = {
+            name: ConcurrencyBudget(*budget)
+            for name, budget in (ADMISSION_BUDGETS if budgets is None else budgets).items()
+        }
+        self.buckets = {
+            name: TokenBuckets(*limit)
+            for name, limit in (RATE_LIMITS if rate_limits is None else rate_limits).items()
+        }
+
+    def stats(self) -> dict:
+        return {name: budget.stats() for name, budget in self.budgets.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits, queues or rejects each request according to its route class."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        route_class = controller.classes.get(scope["path"]) if scope["type"] == "http" else None
+        budget = controller.budgets.get(route_class)
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            buckets = controller.buckets.get(route_class)
+            if buckets is not None:
+                client = scope.get("client")
+                buckets.take(controller.identify(scope) or f"client:{client[0] if client else ''}")
+            await budget.acquire()
+        except Rejected as rejected:
+            ADMISSION_REJECTIONS.inc(route_class=route_class, reason=rejected.reason)
+            await _reject(send, rejected)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release(time.perf_counter() - started)
+
+
+async def _reject(send, rejected: Rejected):
+    detail = "Too many requests, slow down" if rejected.status == 429 else "Server is busy, try again shortly"
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": rejected.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(rejected.retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
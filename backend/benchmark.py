@@ -0,0 +1,290 @@
+"""Offline load benchmark against an in-process BigQuery stand-in.
+
+    python benchmark.py
+    python benchmark.py --concurrency 1 8 32 --requests 500 --latency 0.05 --output bench.json
+    python benchmark.py --scenarios cities filter_cities --baseline bench.json
+
+The app runs in this process with the seeded FakeBigQueryClient from
+fake_bigquery.py installed as its BigQuery client, so no GCP project is needed. Each
+scenario is driven at every concurrency level with a fixed number of
+requests; results (throughput, p50/p99 latency, errors) are written as JSON
+along with the commit they were measured on, and ``--baseline`` prints the
+change against an earlier run. Per-user rate limits are off unless
+``--rate-limits`` is given; requests shed with 429 or 503 are reported as
+rejected and left out of the latency figures.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fake_bigquery import BENCH_PASSWORD, SEED, VISA_TYPES, FakeBigQueryClient, seed_tables
+
+CONCURRENCY_LEVELS = (1, 8, 32)
+SCENARIO_REQUESTS = 400
+# Logins are bcrypt-bound, so they get a smaller default count
+TOKEN_REQUESTS = 40
+WARMUP_REQUESTS = 10
+
+Request = Tuple[str, str, dict]
+
+
+# -----------------------
+# 🔹 Scenarios
+# -----------------------
+def _token(i: int, emails: List[str], tokens: List[str], size: int) -> Request:
+    return "POST", "/token", {"data": {"username": emails[i % len(emails)], "password": BENCH_PASSWORD}}
+
+
+def _cities(i: int, emails: List[str], tokens: List[str], size: int) -> Request:
+    offset = (i * 50) % max(size - 50, 1)
+    return "GET", f"/cities?limit=50&offset={offset}", {"headers": _auth(tokens, i)}
+
+
+def _filter_cities(i: int, emails: List[str], tokens: List[str], size: int) -> Request:
+    # A fixed rotation of sidebar states, so runs mix page-cache hits and fresh filters
+    params = [f"min_temp={(i % 6) * 5}", f"max_cost={1000 + (i % 8) * 250}", "limit=50"]
+    if i % 3 == 0:
+        params.append(f"visa_type={VISA_TYPES[i % len(VISA_TYPES)].replace(' ', '+')}")
+    return "GET", "/filter_cities?" + "&".join(params), {"headers": _auth(tokens, i)}
+
+
+def _plans(i: int, emails: List[str], tokens: List[str], size: int) -> Request:
+    return "GET", "/plans?limit=20", {"headers": _auth(tokens, i)}
+
+
+class _PlanPages:
+    """Walks every user's plans a page at a time, following X-Next-Cursor and starting over at the end."""
+
+    def __init__(self):
+        self.cursors: Dict[int, str] = {}
+
+    def __call__(self, i: int, emails: List[str], tokens: List[str], size: int) -> Request:
+        cursor = self.cursors.get(i % len(tokens))
+        url = "/plans?limit=5" + (f"&cursor={cursor}" if cursor else "")
+        return "GET", url, {"headers": _auth(tokens, i)}
+
+    def observe(self, i: int, tokens: List[str], response):
+        slot = i % len(tokens)
+        cursor = response.headers.get("x-next-cursor") if response.status_code == 200 else None
+        if cursor:
+            self.cursors[slot] = cursor
+        else:
+            self.cursors.pop(slot, None)
+
+
+def _profile(i: int, emails: List[str], tokens: List[str], size: int) -> Request:
+    return "GET", "/profile", {"headers": _auth(tokens, i)}
+
+
+def _auth(tokens: List[str], i: int) -> dict:
+    return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+
+SCENARIOS: Dict[str, Callable[[int, List[str], List[str], int], Request]] = {
+    "token": _token,
+    "cities": _cities,
+    "filter_cities": _filter_cities,
+    "plans": _plans,
+    "plan_pages": _PlanPages(),
+    "profile": _profile,
+}
+
+
+# -----------------------
+# 🔹 Runner
+# -----------------------
+def install_fake(client: FakeBigQueryClient, log_dir: str, rate_limits: bool = False):
+    """Make ``client`` the app's BigQuery client; must run before importing main."""
+    import admission
+    import database
+    import write_buffer
+
+    os.environ.setdefault("STORAGE_BACKEND", "bigquery")
+    database.set_client(client)
+    # Keep the write-behind logs of a development checkout out of the run
+    write_buffer.WRITE_LOG_DIR = log_dir
+    # A few users replay many requests each, which the per-user limits would mostly turn away
+    if not rate_limits:
+        admission.RATE_LIMITS = {}
+
+
+async def _drive(
+    http,
+    build: Callable[[int], Request],
+    requests: int,
+    concurrency: int,
+    observe: Optional[Callable[[int, object], None]] = None,
+) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    rejected = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, rejected, next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, url, kwargs = build(i)
+            started = time.perf_counter()
+            response = await http.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - started
+            if observe is not None:
+                observe(i, response)
+            if response.status_code in (429, 503):
+                # Shed by admission control; counted, but kept out of the latency figures
+                rejected += 1
+                continue
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    millis = np.array(latencies or [0.0]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "rejected": rejected,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(millis, 50)), 3),
+        "p99_ms": round(float(np.percentile(millis, 99)), 3),
+        "mean_ms": round(float(millis.mean()), 3),
+        "max_ms": round(float(millis.max()), 3),
+    }
+
+
+async def run(args, tables: Dict[str, List[dict]]) -> List[dict]:
+    import httpx
+    import main
+
+    emails = [user["email"] for user in tables["users"]]
+    size = len(tables["cities"])
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+            tokens = []
+            for email in emails:
+                response = await http.post("/token", data={"username": email, "password": BENCH_PASSWORD})
+                response.raise_for_status()
+                tokens.append(response.json()["access_token"])
+
+            for name in args.scenarios:
+                scenario = SCENARIOS[name]
+
+                def build(i: int) -> Request:
+                    return scenario(i, emails, tokens, size)
+
+                def observe(i: int, response):
+                    scenario.observe(i, tokens, response)
+
+                requests = args.token_requests if name == "token" else args.requests
+                follow = observe if hasattr(scenario, "observe") else None
+                await _drive(http, build, min(args.warmup, requests), 1, follow)
+                for concurrency in args.concurrency:
+                    result = {"scenario": name, **await _drive(http, build, requests, concurrency, follow)}
+                    print(
+                        f"{name:>14} c={concurrency:<3} {result['throughput_rps']:>9.1f} req/s"
+                        f"  p50 {result['p50_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms"
+                        f"  errors {result['errors']}  rejected {result['rejected']}",
+                        file=sys.stderr,
+                    )
+                    results.append(result)
+    return results
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline: dict):
+    """Print throughput and p99 change against a previous run's results."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"Compared with {baseline['meta'].get('commit') or 'baseline'}:", file=sys.stderr)
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        throughput = (result["throughput_rps"] / before["throughput_rps"] - 1) * 100
+        p99 = (result["p99_ms"] / before["p99_ms"] - 1) * 100 if before["p99_ms"] else 0.0
+        print(
+            f"{result['scenario']:>14} c={result['concurrency']:<3} throughput {throughput:+7.1f}%  p99 {p99:+7.1f}%",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the API against a seeded in-process BigQuery stand-in.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=list(CONCURRENCY_LEVELS))
+    parser.add_argument("--requests", type=int, default=SCENARIO_REQUESTS, help="Requests per scenario and level")
+    parser.add_argument("--token-requests", type=int, default=TOKEN_REQUESTS)
+    parser.add_argument("--warmup", type=int, default=WARMUP_REQUESTS, help="Unmeasured requests before each scenario")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mean seconds per fake BigQuery job")
+    parser.add_argument("--jitter", type=float, default=0.25, help="+/- fraction around --latency")
+    parser.add_argument("--cities", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--plans", type=int, default=20, help="Plans per user")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument(
+        "--rate-limits", action="store_true", help="Keep the per-user rate limits; their 429s are counted as rejected"
+    )
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    tables = seed_tables(args.cities, args.users, args.plans, args.seed)
+    client = FakeBigQueryClient(tables, latency=args.latency, jitter=args.jitter, seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix="nomad-bench-") as log_dir:
+        install_fake(client, log_dir, args.rate_limits)
+        results = asyncio.run(run(args, tables))
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "cities": args.cities,
+            "users": args.users,
+            "plans_per_user": args.plans,
+            "rate_limits": args.rate_limits,
+            "warehouse_queries": client.queries,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import concurrent.futures
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from google.cloud import bigquery
+
+from database import get_client, USERS_TABLE, TRAVEL_PLANS_TABLE, PREFERENCES_TABLE, QUERY_TIMEOUT_SECONDS, query_deadline
+from repository import Page, Repository, keyset_page
+from metrics import QUERY_ERRORS, record_job
+from query_cache import QueryResultCache
+from write_buffer import WriteBehindBuffer
+
+
+class BigQueryRepository(Repository):
+    def __init__(self):
+        # Results of SELECTs, keyed on SQL and parameters; identical misses share one job
+        self.cache = QueryResultCache()
+        # Signups and new plans are batched into streaming inserts off the request path;
+        # cached reads are invalidated when a write is accepted and again once it lands
+        self.user_writer = WriteBehindBuffer(get_client, USERS_TABLE, on_flushed=self._users_written)
+        self.plan_writer = WriteBehindBuffer(get_client, TRAVEL_PLANS_TABLE, on_flushed=self._plans_written)
+
+    # -----------------------
+    # 🔹 QUERY EXECUTION
+    # -----------------------
+    def _run_query(
+        self,
+        query_class: str,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None,
+        tags: Sequence[str] = (),
+    ) -> list:
+        return self.cache.get_or_run(
+            query_class, query, _params_key(job_config), lambda: self._execute(query, job_config, query_class), tags
+        )
+
+    def _execute(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None, site: str = "other") -> list:
+        deadline = query_deadline.get()
+        timeout = QUERY_TIMEOUT_SECONDS if deadline is None else max(deadline - time.monotonic(), 0.1)
+        started = time.perf_counter()
+        job = get_client().query(query, job_config=job_config)
+        try:
+            rows = list(job.result(timeout=timeout))
+        except concurrent.futures.TimeoutError:
+            QUERY_ERRORS.inc(site=site)
+            # The caller has given up; stop the job instead of letting it run on
+            job.cancel()
+            raise
+        except Exception:
+            QUERY_ERRORS.inc(site=site)
+            raise
+        record_job(site, job, time.perf_counter() - started, len(rows))
+        return rows
+
+    # -----------------------
+    # 🔹 USERS
+    # -----------------------
+    def fetch_user(self, user_id: str):
+        query = f"""
+            SELECT * FROM `{USERS_TABLE}`
+            WHERE id = @user_id
+            LIMIT 1
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+        )
+        return next(iter(self._run_query("user", query, job_config, [f"user:{user_id}"])), None)
+
+    def fetch_user_by_email(self, email: str):
+        query = f"""
+            SELECT * FROM `{USERS_TABLE}`
+            WHERE email = @user_email
+            LIMIT 1
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("user_email", "STRING", email)]
+        )
+        return next(iter(self._run_query("user", query, job_config, [f"email:{email}"])), None)
+
+    def list_users(self, skip: int, limit: int, after: Optional[Sequence] = None) -> Page:
+        params = [bigquery.ScalarQueryParameter("limit", "INT64", limit + 1)]
+        if after is not None:
+            # Keyset seek: the warehouse starts right after the previous page
+            # instead of reading and discarding every earlier row
+            seek = "WHERE email > @after_email OR (email = @after_email AND id > @after_id)"
+            params += [
+                bigquery.ScalarQueryParameter("after_email", "STRING", after[0]),
+                bigquery.ScalarQueryParameter("after_id", "STRING", after[1]),
+            ]
+            skip = 0
+        else:
+            seek = ""
+        params.append(bigquery.ScalarQueryParameter("skip", "INT64", skip))
+
+        query = f"""
+            SELECT * FROM `{USERS_TABLE}`
+            {seek}
+            ORDER BY email, id
+            LIMIT @limit OFFSET @skip
+        """
+        rows = self._run_query("users", query, bigquery.QueryJobConfig(query_parameters=params), ["users"])
+        return keyset_page(rows, limit, ("email", "id"))
+
+    def add_user(self, row: dict):
+        self.user_writer.append(row)
+        self._users_written([row])
+
+    def _users_written(self, rows: List[dict]):
+        self.cache.invalidate("users", *(f"email:{row['email']}" for row in rows), *(f"user:{row['id']}" for row in rows))
+
+    def update_password_hash(self, user_id: str, password_hash: str):
+        query = f"""
+            UPDATE `{USERS_TABLE}`
+            SET password_hash = @password_hash
+            WHERE id = @user_id
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("password_hash", "STRING", password_hash),
+                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            ]
+        )
+        self._execute(query, job_config, "update_password_hash")
+        # Lookups by email are left to expire: the old hash still verifies the same password
+        self.cache.invalidate(f"user:{user_id}")
+
+    # -----------------------
+    # 🔹 TRAVEL PLANS
+    # -----------------------
+    def list_travel_plans(self, user_id: str, skip: int, limit: int, after: Optional[Sequence] = None) -> Page:
+        params = [
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("limit", "INT64", limit + 1),
+        ]
+        if after is not None:
+            seek = "AND (created_at < @after_created_at OR (created_at = @after_created_at AND id < @after_id))"
+            params += [
+                bigquery.ScalarQueryParameter("after_created_at", "TIMESTAMP", datetime.fromisoformat(after[0])),
+                bigquery.ScalarQueryParameter("after_id", "INT64" if isinstance(after[1], int) else "STRING", after[1]),
+            ]
+            skip = 0
+        else:
+            seek = ""
+        params.append(bigquery.ScalarQueryParameter("skip", "INT64", skip))
+
+        query = f"""
+            SELECT * FROM `{TRAVEL_PLANS_TABLE}`
+            WHERE user_id = @user_id
+            {seek}
+            ORDER BY created_at DESC, id DESC
+            LIMIT @limit OFFSET @skip
+        """
+        rows = self._run_query("plans", query, bigquery.QueryJobConfig(query_parameters=params), [f"plans:{user_id}"])
+        return keyset_page(rows, limit, ("created_at", "id"))
+
+    def add_travel_plan(self, row: dict):
+        self.plan_writer.append({
+            **row,
+            "date_range": json.dumps(row["date_range"]),
+            "transportation": json.dumps(row["transportation"]),
+            "accommodation": json.dumps(row["accommodation"]),
+            "budget": json.dumps(row["budget"]),
+            "created_at": row["created_at"].isoformat(),
+        })
+        self._plans_written([row])
+
+    def _plans_written(self, rows: List[dict]):
+        self.cache.invalidate(*{f"plans:{row['user_id']}" for row in rows})
+
+    # -----------------------
+    # 🔹 PREFERENCES
+    # -----------------------
+    def save_preferences(self, user_id: str, preferences: dict):
+        self.save_preferences_batch({user_id: preferences})
+
+    def save_preferences_batch(self, preferences_by_user: Dict[str, dict]):
+        """Upsert many users' preferences with one atomic MERGE job."""
+        query = f"""
+            MERGE `{PREFERENCES_TABLE}` AS target
+            USING UNNEST(@rows) AS source
+            ON target.user_id = source.user_id
+            WHEN MATCHED THEN
+                UPDATE SET preferences = source.preferences
+            WHEN NOT MATCHED THEN
+                INSERT (user_id, preferences) VALUES (source.user_id, source.preferences)
+        """
+        rows = [
+            bigquery.StructQueryParameter(
+                None,
+                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+                bigquery.ScalarQueryParameter("preferences", "STRING", json.dumps(preferences, separators=(",", ":"))),
+            )
+            for user_id, preferences in preferences_by_user.items()
+        ]
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("rows", "STRUCT", rows)]
+        )
+        self._execute(query, job_config, "save_preferences")
+
+    def stats(self) -> dict:
+        return {
+            "query_cache": self.cache.stats(),
+            "pending_writes": {"users": self.user_writer.pending, "plans": self.plan_writer.pending},
+        }
+
+    def close(self):
+        for writer in (self.user_writer, self.plan_writer):
+            writer.close()
+
+
+def _params_key(job_config: Optional[bigquery.QueryJobConfig]) -> str:
+    params = [p.to_api_repr() for p in (job_config.query_parameters if job_config else [])]
+    return json.dumps(params, sort_keys=True, default=str)
@@ -0,0 +1,430 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from city_records import City, NUMERIC_FIELDS, decode_rows
+from database import CITIES_TABLE
+from facets import FacetIndex
+from fast_json import dumps
+from geo import GeoIndex
+from metrics import record_job
+from shared_catalog import Buffers, SharedCatalogDirectory
+
+CATALOG_REFRESH_SECONDS = 15 * 60
+CATALOG_RETRY_SECONDS = 30
+# Directory (ideally on tmpfs, e.g. /dev/shm/nomad-catalog) through which worker processes share one catalog
+SHARED_CATALOG_DIR = os.environ.get("SHARED_CATALOG_DIR")
+SHARED_CATALOG_POLL_SECONDS = 5
+# Served when the warehouse cannot be reached, until a refresh succeeds
+MOCK_CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_data", "cities.json")
+
+CATALOG_QUERY = f"""
+    SELECT id, name, country, lat, lng,
+           averageTemperature, precipitation, seasons,
+           housing, food, transportation, entertainment, costOfLivingIndex, totalCost,
+           averageWifiSpeed, coworkingSpaces,
+           healthcareIndex, safetyIndex, pollutionIndex,
+           communitySize, monthlyMeetups, visaRequirements
+    FROM `{CITIES_TABLE}`
+"""
+
+
+class CatalogUnavailable(Exception):
+    pass
+
+
+def _sort_key(name: Optional[str], city_id: Optional[str]) -> tuple:
+    return (name is not None, name or "", city_id is not None, city_id or "")
+
+
+# -----------------------
+# 🔹 COLUMN BUFFERS
+# -----------------------
+class StringColumn:
+    """Variable-length values packed into one byte buffer with row offsets; decoded on access."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray, valid: np.ndarray, decode: bool = True):
+        self.offsets = offsets
+        self.data = data
+        self.valid = valid
+        self.decode = decode
+        # Memoryviews index and slice without creating NumPy scalars
+        self._offsets = memoryview(offsets)
+        self._data = memoryview(data)
+
+    def __len__(self) -> int:
+        return self.valid.size
+
+    def raw(self, i: int) -> bytes:
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int):
+        if not self.valid[i]:
+            return None
+        value = self.raw(i)
+        return value.decode() if self.decode else value
+
+
+def _pack(name: str, values: Sequence[Optional[bytes]]) -> Buffers:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value or b"") for value in values], out=offsets[1:])
+    return {
+        f"{name}.offsets": offsets,
+        f"{name}.data": np.frombuffer(b"".join(value or b"" for value in values), dtype=np.uint8),
+        f"{name}.valid": np.array([value is not None for value in values], dtype=bool),
+    }
+
+
+def _strings(buffers: Buffers, name: str, decode: bool = True) -> StringColumn:
+    return StringColumn(buffers[f"{name}.offsets"], buffers[f"{name}.data"], buffers[f"{name}.valid"], decode)
+
+
+def _encode(text: Optional[str]) -> Optional[bytes]:
+    return None if text is None else text.encode()
+
+
+def snapshot_buffers(cities: List[City], version: int, source: str = "warehouse") -> Tuple[Buffers, dict]:
+    """Fixed-layout column buffers and metadata for a snapshot of ``cities``."""
+    size = len(cities)
+    buffers: Buffers = {}
+    buffers.update(_pack("id", [_encode(city.id) for city in cities]))
+    buffers.update(_pack("name", [_encode(city.name) for city in cities]))
+    buffers.update(_pack("country", [_encode(city.country) for city in cities]))
+    # Each record serialized once; responses splice these bytes instead of re-encoding
+    buffers.update(_pack("fragment", [dumps(city.to_dict()) for city in cities]))
+
+    columns = {
+        name: np.array([getattr(city, name) for city in cities], dtype=np.float64)
+        for name in NUMERIC_FIELDS
+    }
+    if all(city.totalCost is None for city in cities):
+        # No stored totals (flat table, mock data): add up the cost metrics
+        columns["totalCost"] = columns["housing"] + columns["food"] + columns["transportation"] + columns["entertainment"]
+    else:
+        columns["totalCost"] = np.array([city.totalCost for city in cities], dtype=np.float64)
+    for name, values in columns.items():
+        buffers[f"column.{name}"] = values
+        # Statistics used to order filter predicates by selectivity
+        buffers[f"sorted.{name}"] = np.sort(values[~np.isnan(values)])
+
+    # Visa requirements are few distinct strings: stored as codes into a vocabulary
+    visas = sorted({city.visaRequirements for city in cities}, key=lambda v: (v is not None, v or ""))
+    code_of = {visa: code for code, visa in enumerate(visas)}
+    buffers["visa.codes"] = np.array([code_of[city.visaRequirements] for city in cities], dtype=np.int32)
+    for i, city in enumerate(cities):
+        for season in city.seasons:
+            buffers.setdefault(f"season.{season}", np.zeros(size, dtype=bool))[i] = True
+
+    # Rows ordered the way the warehouse sorts them: ORDER BY name, id with NULLs first
+    keys = [_sort_key(city.name, city.id) for city in cities]
+    buffers["order"] = np.array(sorted(range(size), key=keys.__getitem__), dtype=np.int64)
+    # Rows by id bytes for lookups; the stable sort keeps the first row of a duplicated id first
+    buffers["id_order"] = np.array(sorted(range(size), key=lambda i: _encode(cities[i].id) or b""), dtype=np.int64)
+
+    loaded_at = time.time()
+    meta = {
+        "version": version,
+        "source": source,
+        # Content hash: equal across processes and restarts for the same rows
+        "fingerprint": hashlib.blake2b(
+            json.dumps([[getattr(city, f) for f in City.__slots__] for city in cities], default=str).encode(),
+            digest_size=16,
+        ).hexdigest(),
+        "loaded_at": loaded_at,
+        "modified_at": loaded_at,
+        "size": size,
+        "visas": visas,
+    }
+    return buffers, meta
+
+
+# -----------------------
+# 🔹 CATALOG SNAPSHOT
+# -----------------------
+class CatalogSnapshot:
+    """Immutable column-oriented view of the cities table.
+
+    All row data lives in flat buffers (see snapshot_buffers), either built in
+    this process or mapped read-only from a file another worker published.
+    """
+
+    def __init__(self, cities: List[City], version: int, source: str = "warehouse"):
+        self._attach(*snapshot_buffers(cities, version, source))
+
+    @classmethod
+    def from_buffers(cls, buffers: Buffers, meta: dict) -> "CatalogSnapshot":
+        snapshot = cls.__new__(cls)
+        snapshot._attach(buffers, meta)
+        return snapshot
+
+    def _attach(self, buffers: Buffers, meta: dict):
+        self.buffers = buffers
+        self.version = meta["version"]
+        self.source = meta["source"]
+        self.fingerprint = meta["fingerprint"]
+        self.loaded_at = meta["loaded_at"]
+        # When this content was first loaded; kept across refreshes that return the same rows
+        self.modified_at = meta["modified_at"]
+        self.size = meta["size"]
+        self._visa_vocabulary = meta["visas"]
+
+        self.ids = _strings(buffers, "id")
+        self.names = _strings(buffers, "name")
+        self.countries = _strings(buffers, "country")
+        self.fragments = _strings(buffers, "fragment", decode=False)
+        self.columns = {name[7:]: values for name, values in buffers.items() if name.startswith("column.")}
+        self.sorted_columns = {name[7:]: values for name, values in buffers.items() if name.startswith("sorted.")}
+        self.season_masks = {name[7:]: mask for name, mask in buffers.items() if name.startswith("season.")}
+        self.order = buffers["order"]
+        self._id_order = buffers["id_order"]
+
+        codes = buffers["visa.codes"]
+        vocabulary = np.empty(len(self._visa_vocabulary), dtype=object)
+        vocabulary[:] = self._visa_vocabulary
+        self.visas = vocabulary[codes]
+        counts = np.bincount(codes, minlength=len(vocabulary)).tolist()
+        self.visa_counts = Counter({visa: n for visa, n in zip(self._visa_vocabulary, counts) if n})
+
+        # Built with the snapshot so map queries never pay for it on the request path
+        self.geo = GeoIndex(self.columns["lat"], self.columns["lng"])
+        self.facets = FacetIndex(self)
+
+    def meta(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "modified_at": self.modified_at,
+            "size": self.size,
+            "visas": self._visa_vocabulary,
+        }
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def estimate_range(self, name: str, low: Optional[float] = None, high: Optional[float] = None) -> float:
+        """Fraction of rows whose value falls inside [low, high], from the sorted column."""
+        values = self.sorted_columns[name]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = values.size if high is None else np.searchsorted(values, high, side="right")
+        return max(int(end) - int(start), 0) / max(self.size, 1)
+
+    def all_rows(self) -> np.ndarray:
+        return np.ones(self.size, dtype=bool)
+
+    def range_mask(self, values: np.ndarray, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        """Rows whose value is present and inside [low, high]; NaN bounds match nothing."""
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def page(
+        self,
+        mask: Optional[np.ndarray] = None,
+        limit: int = 50,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> Tuple[List[dict], Optional[tuple]]:
+        """One page in (name, id) order plus the key to continue from, if any rows remain.
+
+        With ``after`` the page starts right behind that key (found by bisection),
+        so deep pages cost the same as the first; ``offset`` is kept for old clients.
+        """
+        rows, next_key = self.page_rows(mask, limit, offset, after)
+        return [self.record(i) for i in rows], next_key
+
+    def page_rows(
+        self,
+        mask: Optional[np.ndarray] = None,
+        limit: int = 50,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> Tuple[np.ndarray, Optional[tuple]]:
+        """Row indices of the page described in ``page``."""
+        start = 0 if after is None else bisect.bisect_right(self.order, _sort_key(*after), key=self._sort_key)
+        ordered = self.order[start:]
+        if mask is not None:
+            ordered = ordered[mask[ordered]]
+        rows = ordered[offset:offset + limit + 1]
+
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (self.names[rows[-1]], self.ids[rows[-1]])
+        return rows, next_key
+
+    def _sort_key(self, i: int) -> tuple:
+        return _sort_key(self.names[i], self.ids[i])
+
+    def record(self, i: int) -> dict:
+        return orjson.loads(self.fragments[i])
+
+    def city(self, i: int) -> City:
+        return City.from_dict(self.record(i))
+
+    def row_of(self, city_id: str) -> Optional[int]:
+        """Row of ``city_id`` by bisection over the id order; the first row wins for duplicates."""
+        target = city_id.encode()
+        j = bisect.bisect_left(self._id_order, target, key=self.ids.raw)
+        if j < self.size and self.ids.raw(self._id_order[j]) == target:
+            return int(self._id_order[j])
+        return None
+
+    def get(self, city_id: str) -> Optional[dict]:
+        i = self.row_of(city_id)
+        return None if i is None else self.record(i)
+
+    def get_many(self, city_ids: Sequence[str]) -> Tuple[List[int], List[str]]:
+        """Rows for the given ids in request order, plus the ids that were not found."""
+        found, missing = [], []
+        for city_id in city_ids:
+            i = self.row_of(city_id)
+            if i is None:
+                missing.append(city_id)
+            else:
+                found.append(i)
+        return found, missing
+
+    def fragments_for(self, rows) -> List[bytes]:
+        raw = self.fragments.raw
+        return [raw(i) for i in (rows.tolist() if isinstance(rows, np.ndarray) else rows)]
+
+
+# -----------------------
+# 🔹 CITY CATALOG
+# -----------------------
+class CityCatalog:
+    """Process-local copy of the cities table, loaded once and refreshed on a schedule.
+
+    Readers always get a complete snapshot; a refresh builds the next one off to
+    the side and swaps the reference, so request handlers never wait on BigQuery.
+    If the warehouse is unreachable the bundled mock cities are served instead,
+    and refreshes keep retrying at the shorter interval.
+
+    With ``shared_dir`` set (SHARED_CATALOG_DIR), worker processes share one copy:
+    whichever worker refreshes first queries the warehouse and publishes the
+    buffers to the directory, and every worker maps the published file.
+    """
+
+    def __init__(
+        self,
+        get_client: Callable,
+        refresh_seconds: int = CATALOG_REFRESH_SECONDS,
+        shared_dir: Optional[str] = SHARED_CATALOG_DIR,
+    ):
+        # Called per refresh, so the warehouse client is only built once it is needed
+        self._get_client = get_client
+        self._refresh_seconds = refresh_seconds
+        self._shared = SharedCatalogDirectory(shared_dir) if shared_dir else None
+        self._mapped: Optional[str] = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def from_warehouse(self) -> bool:
+        return self._snapshot is not None and self._snapshot.source == "warehouse"
+
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise CatalogUnavailable("City catalog has not been loaded yet")
+        return snapshot
+
+    def _query(self) -> List[City]:
+        started = time.perf_counter()
+        job = self._get_client().query(CATALOG_QUERY)
+        cities = decode_rows(job.result())
+        record_job("catalog", job, time.perf_counter() - started, len(cities))
+        return cities
+
+    def refresh(self) -> CatalogSnapshot:
+        if self._shared is not None:
+            return self._refresh_shared()
+        cities = self._query()
+        with self._lock:
+            snapshot = CatalogSnapshot(cities, self._version + 1)
+            current = self._snapshot
+            if current is not None and current.source == "warehouse" and current.fingerprint == snapshot.fingerprint:
+                # Unchanged table: keep the current snapshot so derived caches stay warm
+                return current
+            self._version = snapshot.version
+            self._snapshot = snapshot
+        return snapshot
+
+    def _refresh_shared(self) -> CatalogSnapshot:
+        with self._shared.lock():
+            pointer = self._shared.current()
+            if pointer is not None and time.time() - pointer["published_at"] < self._refresh_seconds / 2:
+                # Another worker refreshed a moment ago; use its copy
+                return self._map(pointer)
+            buffers, meta = snapshot_buffers(self._query(), (pointer["version"] if pointer else 0) + 1)
+            if pointer is not None and pointer["fingerprint"] == meta["fingerprint"]:
+                pointer = self._shared.touch(pointer)
+            else:
+                pointer = self._shared.publish(buffers, meta)
+        return self._map(pointer)
+
+    def sync(self) -> Optional[CatalogSnapshot]:
+        """Map the shared directory's current version if another worker has published a new one."""
+        pointer = self._shared.current()
+        return self._snapshot if pointer is None else self._map(pointer)
+
+    def _map(self, pointer: dict) -> CatalogSnapshot:
+        with self._lock:
+            if pointer["file"] == self._mapped:
+                return self._snapshot
+        snapshot = CatalogSnapshot.from_buffers(*self._shared.open(pointer))
+        with self._lock:
+            # The file's version counts publications in the directory; in this process every
+            # swap takes the next number, so caches keyed on the version never see a repeat
+            # (e.g. a mock fallback and a shared file both numbered 1)
+            snapshot.version = self._version + 1
+            self._mapped = pointer["file"]
+            self._version = snapshot.version
+            self._snapshot = snapshot
+        return snapshot
+
+    def load_fallback(self, path: str = MOCK_CITIES_PATH) -> CatalogSnapshot:
+        with open(path, encoding="utf-8") as f:
+            cities = [City.from_dict(city) for city in json.load(f)["cities"]]
+        with self._lock:
+            self._version += 1
+            snapshot = CatalogSnapshot(cities, self._version, source="mock")
+            self._snapshot = snapshot
+            self._mapped = None
+        return snapshot
+
+    async def refresh_periodically(self):
+        while True:
+            delay = self._refresh_seconds if self.from_warehouse else CATALOG_RETRY_SECONDS
+            due = time.monotonic() + delay
+            while self._shared is not None and time.monotonic() < due:
+                # Between refreshes, pick up versions published by other workers
+                await asyncio.sleep(min(SHARED_CATALOG_POLL_SECONDS, due - time.monotonic()))
+                try:
+                    await asyncio.to_thread(self.sync)
+                except Exception as e:
+                    print(f"Error mapping shared city catalog: {e}")
+            await asyncio.sleep(max(due - time.monotonic(), 0))
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"Error refreshing city catalog: {e}")
@@ -0,0 +1,181 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Field order of the City record; matches the SELECT list used for the cities table
+CITY_FIELDS = (
+    "id", "name", "country", "lat", "lng",
+    "averageTemperature", "precipitation", "seasons",
+    "housing", "food", "transportation", "entertainment", "costOfLivingIndex",
+    "averageWifiSpeed", "coworkingSpaces",
+    "healthcareIndex", "safetyIndex", "pollutionIndex",
+    "communitySize", "monthlyMeetups", "visaRequirements",
+)
+
+# Metrics the schemas declare as integers; every other numeric metric is a float
+INTEGER_FIELDS = frozenset(("coworkingSpaces", "communitySize", "monthlyMeetups"))
+TEXT_FIELDS = frozenset(("id", "name", "country", "visaRequirements"))
+NUMERIC_FIELDS = tuple(f for f in CITY_FIELDS if f not in TEXT_FIELDS and f != "seasons")
+
+
+def parse_float(value) -> float:
+    """Parse a warehouse STRING cell; blank or malformed values become NaN."""
+    if value is None:
+        return float("nan")
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return float("nan")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+# -----------------------
+# 🔹 CITY RECORD
+# -----------------------
+class City:
+    """Compact typed city row; missing metrics are None.
+
+    ``totalCost`` is the total the typed table stores, or None when the row
+    came without one (flat tables, mock data).
+    """
+
+    __slots__ = CITY_FIELDS + ("totalCost",)
+
+    def __init__(self, *values, totalCost: Optional[float] = None):
+        for field, value in zip(CITY_FIELDS, values):
+            setattr(self, field, value)
+        self.totalCost = totalCost
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "City":
+        """Build a record from the nested API shape, e.g. an entry of mock_data/cities.json."""
+        flat = {"id": data.get("id"), "name": data.get("name"), "country": data.get("country")}
+        flat.update(data.get("coordinates") or {})
+        for group in (data.get("metrics") or {}).values():
+            flat.update(group)
+        return cls(*(_converter(field, "FLOAT64", "REPEATED")(flat.get(field)) for field in CITY_FIELDS))
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "country": self.country,
+            "coordinates": {
+                "lat": self.lat,
+                "lng": self.lng,
+            },
+            "metrics": {
+                "climate": {
+                    "averageTemperature": self.averageTemperature,
+                    "precipitation": self.precipitation,
+                    "seasons": list(self.seasons),
+                },
+                "cost": {
+                    "housing": self.housing,
+                    "food": self.food,
+                    "transportation": self.transportation,
+                    "entertainment": self.entertainment,
+                    "costOfLivingIndex": self.costOfLivingIndex,
+                },
+                "infrastructure": {
+                    "averageWifiSpeed": self.averageWifiSpeed,
+                    "coworkingSpaces": self.coworkingSpaces,
+                },
+                "qualityOfLife": {
+                    "healthcareIndex": self.healthcareIndex,
+                    "safetyIndex": self.safetyIndex,
+                    "pollutionIndex": self.pollutionIndex,
+                },
+                "digitalNomad": {
+                    "communitySize": self.communitySize,
+                    "monthlyMeetups": self.monthlyMeetups,
+                    "visaRequirements": self.visaRequirements,
+                },
+            },
+        }
+
+
+# -----------------------
+# 🔹 FIELD CONVERTERS
+# -----------------------
+def _text(value):
+    return value
+
+
+def _string_to_float(value):
+    number = parse_float(value)
+    return None if number != number else number
+
+
+def _string_to_int(value):
+    number = parse_float(value)
+    return None if number != number else int(number)
+
+
+def _number_to_float(value):
+    return None if value is None else float(value)
+
+
+def _number_to_int(value):
+    return None if value is None else int(value)
+
+
+def _string_to_list(value):
+    return value.split(", ") if value else []
+
+
+def _repeated_to_list(value):
+    return list(value) if value else []
+
+
+def _converter(field: str, field_type: str, mode: str) -> Callable:
+    if field in TEXT_FIELDS:
+        return _text
+    if field == "seasons":
+        return _repeated_to_list if mode == "REPEATED" else _string_to_list
+    as_int = field in INTEGER_FIELDS
+    if field_type in ("STRING", "BYTES"):
+        return _string_to_int if as_int else _string_to_float
+    return _number_to_int if as_int else _number_to_float
+
+
+# -----------------------
+# 🔹 ROW DECODER
+# -----------------------
+class RowDecoder:
+    """Turns a result batch into City records with converters resolved per schema."""
+
+    def __init__(self, schema: Sequence[Tuple[str, str, str]]):
+        types = {name: (field_type, mode) for name, field_type, mode in schema}
+        # Columns absent from the schema (e.g. mocked results) are read as STRING
+        self.plan: Tuple[Tuple[str, Callable], ...] = tuple(
+            (field, _converter(field, *types.get(field, ("STRING", "NULLABLE"))))
+            for field in CITY_FIELDS
+        )
+        total_type = types.get("totalCost", ("STRING", "NULLABLE"))[0]
+        self.total = _string_to_float if total_type in ("STRING", "BYTES") else _number_to_float
+
+    def decode(self, rows: Iterable) -> List[City]:
+        plan, total = self.plan, self.total
+        # Rows without a totalCost column leave it None; the catalog then sums the cost metrics
+        return [
+            City(*[convert(row[field]) for field, convert in plan], totalCost=total(row.get("totalCost")))
+            for row in rows
+        ]
+
+
+_decoders: Dict[Tuple, RowDecoder] = {}
+
+
+def decoder_for(schema: Optional[Sequence]) -> RowDecoder:
+    key = tuple((f.name, f.field_type, f.mode) for f in schema or ())
+    decoder = _decoders.get(key)
+    if decoder is None:
+        decoder = _decoders[key] = RowDecoder(key)
+    return decoder
+
+
+def decode_rows(results) -> List[City]:
+    """Decode a BigQuery RowIterator (or any iterable of mapping rows) into City records."""
+    return decoder_for(getattr(results, "schema", None)).decode(results)
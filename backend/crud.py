@@ -1,76 +1,66 @@
 import uuid
-from google.cloud import bigquery
-from passlib.context import CryptContext
+from concurrent.futures import Future
+from datetime import datetime
 from typing import Optional, List
-from database import client, USERS_TABLE, TRAVEL_PLANS_TABLE, PREFERENCES_TABLE
+from hashing import PasswordHasher
+from preference_writer import PreferenceCoalescer
+from repository import create_repository
+from user_cache import UserCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs in its own process pool, away from request handling
+password_hasher = PasswordHasher()
+
+# Storage engine selected by STORAGE_BACKEND (BigQuery or local SQLite)
+repository = create_repository()
+
+# Preference toggles are coalesced per user and written in batches
+preference_writer = PreferenceCoalescer(repository)
+
+# Authenticated requests resolve their user from here instead of the store
+user_cache = UserCache()
+
+def close_storage():
+    preference_writer.close()
+    repository.close()
+    password_hasher.close()
 
 # -----------------------
 # 🔹 GET USER BY ID
 # -----------------------
 def get_user(user_id: str):
-    query = f"""
-        SELECT * FROM `{USERS_TABLE}`
-        WHERE id = @user_id
-        LIMIT 1
-    """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
-    )
-    results = client.query(query, job_config=job_config).result()
-    return next(iter(results), None)
+    return user_cache.get_or_load(("id", user_id), lambda: repository.fetch_user(user_id))
 
 # -----------------------
 # 🔹 GET USER BY EMAIL
 # -----------------------
 def get_user_by_email(email: str):
-    query = f"""
-        SELECT * FROM `{USERS_TABLE}`
-        WHERE email = @user_email
-        LIMIT 1
-    """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("user_email", "STRING", email)]
-    )
-    results = client.query(query, job_config=job_config).result()
-    return next(iter(results), None)
+    return user_cache.get_or_load(("email", email), lambda: repository.fetch_user_by_email(email))
 
 # -----------------------
 # 🔹 GET USERS (Pagination)
 # -----------------------
-def get_users(skip: int = 0, limit: int = 100):
-    query = f"""
-        SELECT * FROM `{USERS_TABLE}`
-        ORDER BY email
-        LIMIT @limit OFFSET @skip
-    """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("limit", "INT64", limit),
-            bigquery.ScalarQueryParameter("skip", "INT64", skip),
-        ]
-    )
-    results = client.query(query, job_config=job_config).result()
-    return [row for row in results]
+def get_users(skip: int = 0, limit: int = 100, after: Optional[list] = None):
+    """Users in (email, id) order; pass the previous page's next key as ``after``."""
+    return repository.list_users(skip, limit, after)
 
 # -----------------------
 # 🔹 CREATE USER
 # -----------------------
 def create_user(user):
     user_id = str(uuid.uuid4())  # Generate a unique user ID
-    password_hash = pwd_context.hash(user.password)
+    password_hash = password_hasher.hash(user.password)
 
-    rows_to_insert = [{
+    row = {
         "id": user_id,
         "email": user.email,
         "password_hash": password_hash
-    }]
-
-    errors = client.insert_rows_json(USERS_TABLE, rows_to_insert)
+    }
 
-    if errors:
-        raise Exception(f"BigQuery Insert Error: {errors}")
+    # With BigQuery the row is durably queued and inserted with the next batch;
+    # the cache serves the new user to /token and /profile until then.
+    repository.add_user(row)
+    user_cache.invalidate(email=user.email)
+    user_cache.put(row)
 
     return {
         "id": user_id,
@@ -81,7 +71,7 @@ def create_user(user):
 # 🔹 VERIFY PASSWORD
 # -----------------------
 def verify_password(plain_password: str, password_hash: str):
-    return pwd_context.verify(plain_password, password_hash)
+    return password_hasher.verify_and_update(plain_password, password_hash)[0]
 
 # -----------------------
 # 🔹 AUTHENTICATE USER
@@ -94,91 +84,60 @@ def authenticate_user(email: str, password: str) -> Optional[dict]:
             return create_user(user)
         return None
 
-    if not verify_password(password, user["password_hash"]):
+    verified, new_hash = password_hasher.verify_and_update(password, user["password_hash"])
+    if not verified:
         return None
 
+    if new_hash is not None:
+        # Stored hash predates the current bcrypt cost; upgrade it while we have the password
+        try:
+            repository.update_password_hash(user["id"], new_hash)
+            user_cache.invalidate(user_id=user["id"])
+        except Exception as e:
+            print(f"Error re-hashing password for {user['id']}: {e}")
+
     return user
 
 # -----------------------
 # 🔹 GET USER TRAVEL PLANS
 # -----------------------
-def get_user_travel_plans(user_id: str, skip: int = 0, limit: int = 100):
-    query = f"""
-        SELECT * FROM `{TRAVEL_PLANS_TABLE}`
-        WHERE user_id = @user_id
-        ORDER BY created_at DESC
-        LIMIT @limit OFFSET @skip
-    """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-            bigquery.ScalarQueryParameter("limit", "INT64", limit),
-            bigquery.ScalarQueryParameter("skip", "INT64", skip),
-        ]
-    )
-    results = client.query(query, job_config=job_config).result()
-    return [row for row in results]
+def get_user_travel_plans(user_id: str, skip: int = 0, limit: int = 100, after: Optional[list] = None):
+    """Newest plans first, in (created_at, id) descending order; see get_users for ``after``."""
+    return repository.list_travel_plans(user_id, skip, limit, after)
 
 # -----------------------
 # 🔹 CREATE USER TRAVEL PLAN
 # -----------------------
 def create_user_travel_plan(plan, user_id: str):
-    rows_to_insert = [{
+    row = {
+        "id": str(uuid.uuid4()),
         "user_id": user_id,
-        "destination": plan.destination,
-        "start_date": plan.start_date,
-        "end_date": plan.end_date,
-    }]
-
-    errors = client.insert_rows_json(TRAVEL_PLANS_TABLE, rows_to_insert)
+        "cities": plan.cities,
+        "date_range": plan.date_range,
+        "transportation": plan.transportation,
+        "accommodation": plan.accommodation,
+        "budget": plan.budget,
+        "created_at": datetime.utcnow(),
+    }
 
-    if errors:
-        raise Exception(f"BigQuery Insert Error: {errors}")
+    repository.add_travel_plan(row)
 
-    return plan
+    return row
 
 # -----------------------
 # 🔹 UPDATE USER PREFERENCES
 # -----------------------
-def update_user_preferences(user_id: str, preferences):
-    existing_query = f"""
-        SELECT * FROM `{PREFERENCES_TABLE}`
-        WHERE user_id = @user_id
-        LIMIT 1
-    """
-    
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
-    )
-    results = client.query(existing_query, job_config=job_config).result()
-
-    existing_pref = next(iter(results), None)
-
-    if existing_pref:
-        update_query = f"""
-            UPDATE `{PREFERENCES_TABLE}`
-            SET preferences = @preferences
-            WHERE user_id = @user_id
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("preferences", "STRING", preferences.json()),
-                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-            ]
-        )
-    else:
-        update_query = f"""
-            INSERT INTO `{PREFERENCES_TABLE}` (user_id, preferences)
-            VALUES (@user_id, @preferences)
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-                bigquery.ScalarQueryParameter("preferences", "STRING", preferences.json()),
-            ]
-        )
-
-    job = client.query(update_query, job_config=job_config)
-    job.result()
-    
-    return preferences
+def update_user_preferences(user_id: str, preferences) -> Future:
+    # Resolves once the batch carrying this user's latest state is stored; a
+    # newer toggle sent within the window supersedes this one and is what gets stored
+    updated = Future()
+
+    def stored(write: Future):
+        if write.exception() is not None:
+            updated.set_exception(write.exception())
+            return
+        user_cache.invalidate(user_id=user_id)
+        updated.set_result({"user_id": user_id, **write.result()})
+
+    preference_writer.submit(user_id, preferences.model_dump()).add_done_callback(stored)
+    return updated
@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from database import QUERY_TIMEOUT_SECONDS, query_deadline
+
+DAL_MAX_WORKERS = 32
+
+# Maximum warehouse calls in flight per endpoint group; keeps one hot route
+# from taking every executor thread
+ENDPOINT_LIMITS = {
+    "auth": 16,
+    "users": 4,
+    "plans": 8,
+}
+DEFAULT_ENDPOINT_LIMIT = 8
+
+
+class AsyncDataAccess:
+    """Runs blocking BigQuery work off the event loop.
+
+    Calls go to a bounded thread pool, are capped per endpoint group and carry
+    a deadline: the awaiting request gives up with 504 when it passes, and the
+    query helpers in crud cancel the underlying job at the same deadline.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DAL_MAX_WORKERS,
+        limits: Optional[Dict[str, int]] = None,
+        timeout: float = QUERY_TIMEOUT_SECONDS,
+    ):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bigquery")
+        self._limits = dict(ENDPOINT_LIMITS if limits is None else limits)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._timeout = timeout
+        # Per endpoint group: calls waiting for a slot, and calls holding one
+        self.waiting: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            limit = self._limits.get(endpoint, DEFAULT_ENDPOINT_LIMIT)
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def run(self, endpoint: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        timeout = self._timeout if timeout is None else timeout
+        context = contextvars.copy_context()
+        context.run(query_deadline.set, time.monotonic() + timeout)
+
+        async def call():
+            semaphore = self._semaphore(endpoint)
+            self.waiting[endpoint] = self.waiting.get(endpoint, 0) + 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self.waiting[endpoint] -= 1
+            self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + 1
+            try:
+                work = functools.partial(context.run, fn, *args, **kwargs)
+                return await asyncio.get_running_loop().run_in_executor(self._executor, work)
+            finally:
+                self.in_flight[endpoint] -= 1
+                semaphore.release()
+
+        try:
+            return await asyncio.wait_for(call(), timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Data store did not respond in time",
+            )
+
+    def queue_depth(self) -> int:
+        """Calls submitted to the thread pool that no worker has picked up yet."""
+        return self._executor._work_queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "waiting": dict(self.waiting),
+            "in_flight": dict(self.in_flight),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
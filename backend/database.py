@@ -1,14 +1,64 @@
+from contextvars import ContextVar
+from typing import Optional
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
+from sqlalchemy.orm import declarative_base
 import os
+import threading
 
 # Get the absolute path of the JSON key file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CREDENTIALS_PATH = os.path.join(BASE_DIR, "capstone-justus-51d7198c35df.json")
 
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = CREDENTIALS_PATH
+# HTTP connections kept open to the BigQuery API; sized for the data-access threads sharing the client
+BIGQUERY_POOL_SIZE = int(os.environ.get("BIGQUERY_POOL_SIZE", "32"))
 
-# Initialize BigQuery client
-client = bigquery.Client()
+_client: Optional[bigquery.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> bigquery.Client:
+    """The process-wide BigQuery client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def _create_client() -> bigquery.Client:
+    # The bundled key file is used when present; otherwise the environment's default credentials
+    if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ and os.path.exists(CREDENTIALS_PATH):
+        credentials = service_account.Credentials.from_service_account_file(
+            CREDENTIALS_PATH, scopes=bigquery.Client.SCOPE
+        )
+        project = credentials.project_id
+    else:
+        credentials, project = google.auth.default(scopes=bigquery.Client.SCOPE)
+    # The client's own session, with a connection pool sized for BIGQUERY_POOL_SIZE
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=BIGQUERY_POOL_SIZE, pool_maxsize=BIGQUERY_POOL_SIZE)
+    session.mount("https://", adapter)
+    return bigquery.Client(project=project, credentials=credentials, _http=session)
+
+
+def set_client(client):
+    """Use ``client`` as the process-wide client (e.g. an in-process stand-in for benchmarks)."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
 
 # Dataset and Table References
 PROJECT_ID = "capstone-justus"
@@ -17,3 +67,16 @@ DATASET_ID = "digital_nomad"
 USERS_TABLE = f"{PROJECT_ID}.{DATASET_ID}.users"
 TRAVEL_PLANS_TABLE = f"{PROJECT_ID}.{DATASET_ID}.travel_plans"
 PREFERENCES_TABLE = f"{PROJECT_ID}.{DATASET_ID}.preferences"
+CITIES_TABLE = f"{PROJECT_ID}.{DATASET_ID}.cities"
+
+# Local SQLite store used when STORAGE_BACKEND=sqlite (see models.py for the tables)
+SQLITE_URL = os.environ.get("SQLITE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'nomad_store.db')}")
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+
+Base = declarative_base()
+
+# Default budget for a single warehouse job
+QUERY_TIMEOUT_SECONDS = 30
+
+# Absolute deadline (time.monotonic) for warehouse work done on behalf of the current request
+query_deadline: ContextVar[Optional[float]] = ContextVar("query_deadline", default=None)
@@ -0,0 +1,67 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Sequence
+
+from city_records import CITY_FIELDS
+from fast_json import dumps
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows per yielded chunk, and per storage page for plan exports
+EXPORT_CHUNK_ROWS = 500
+
+
+def _csv_chunk(header: Optional[Sequence[str]], rows: List[Sequence]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def _csv_value(value):
+    # Nested plan fields are written as JSON text in their cell
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode()
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _city_row(city) -> list:
+    # Same flat shape as the warehouse table: seasons as a comma-separated string
+    return [
+        ", ".join(city.seasons) if field == "seasons" else getattr(city, field)
+        for field in CITY_FIELDS
+    ]
+
+
+def city_chunks(snapshot, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """The whole catalog in (name, id) order, ``chunk_rows`` records per chunk."""
+    if fmt == "csv":
+        yield _csv_chunk(CITY_FIELDS, [])
+    for start in range(0, snapshot.size, chunk_rows):
+        rows = snapshot.order[start:start + chunk_rows]
+        if fmt == "csv":
+            yield _csv_chunk(None, [_city_row(snapshot.city(i)) for i in rows])
+        else:
+            yield b"\n".join(snapshot.fragments_for(rows)) + b"\n"
+
+
+async def plan_chunks(
+    fetch_page: Callable[[Optional[Sequence]], Awaitable[tuple]],
+    fields: Sequence[str],
+    fmt: str,
+) -> AsyncIterator[bytes]:
+    """A user's plans, one storage page per chunk, following the keyset cursor to the end."""
+    if fmt == "csv":
+        yield _csv_chunk(fields, [])
+    after = None
+    while True:
+        plans, after = await fetch_page(after)
+        if plans:
+            if fmt == "csv":
+                yield _csv_chunk(None, [[_csv_value(plan.get(field)) for field in fields] for plan in plans])
+            else:
+                yield b"".join(dumps({field: plan.get(field) for field in fields}) + b"\n" for plan in plans)
+        if after is None:
+            return
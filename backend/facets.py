@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import schemas
+from filter_plan import SPEED_BANDS, WEATHER_BANDS, compile_filters
+
+# Histogram edges; the last bucket is open-ended
+COST_BUCKET_EDGES = (0, 1000, 1500, 2000, 2500, 3000, 4000)
+TEMPERATURE_BUCKET_EDGES = (-10, 0, 5, 10, 15, 20, 25, 30)
+
+# Facet -> name of the compiled predicate that the facet's own sidebar control produces
+FACET_PREDICATES = {
+    "visa": "visa",
+    "seasons": "seasons",
+    "weather": "weather",
+    "speed": "speed",
+    "cost": "maxTotal",
+    "temperature": "temperature",
+}
+
+
+def _band(values: np.ndarray, low: Optional[float], high: Optional[float]) -> np.ndarray:
+    mask = ~np.isnan(values)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values < high
+    return mask
+
+
+def _histogram(values: np.ndarray, edges) -> List[Tuple[dict, np.ndarray]]:
+    bounds = list(zip(edges, list(edges[1:]) + [None]))
+    return [({"min": low, "max": high}, _band(values, low, high)) for low, high in bounds]
+
+
+class FacetIndex:
+    """Per-snapshot bitmaps for every sidebar option.
+
+    Each option (a visa type, a season, a cost bucket, ...) is a packed bitmap
+    over the snapshot rows. Counts for a filter state are popcounts of the
+    option bitmap ANDed with the rows that pass every *other* active filter,
+    so each facet shows what selecting an option would add.
+    """
+
+    def __init__(self, snapshot):
+        self.size = snapshot.size
+        temperature = snapshot.column("averageTemperature")
+        speed = snapshot.column("averageWifiSpeed")
+
+        options: Dict[str, List[Tuple[dict, np.ndarray]]] = {
+            "visa": [({"value": visa}, snapshot.visas == visa) for visa in sorted(v for v in snapshot.visa_counts if v)],
+            "seasons": [({"value": season}, mask) for season, mask in sorted(snapshot.season_masks.items())],
+            "weather": [({"value": label}, _band(temperature, *band)) for label, band in WEATHER_BANDS.items()],
+            "speed": [({"value": label}, _band(speed, *band)) for label, band in SPEED_BANDS.items()],
+            "cost": _histogram(snapshot.column("totalCost"), COST_BUCKET_EDGES),
+            "temperature": _histogram(temperature, TEMPERATURE_BUCKET_EDGES),
+        }
+        self.options = {
+            facet: [(label, np.packbits(mask)) for label, mask in entries]
+            for facet, entries in options.items()
+        }
+        # Counts with no filters applied, served as-is for an empty sidebar
+        self.unfiltered = {
+            facet: [{**label, "count": int(np.bitwise_count(bits).sum())} for label, bits in entries]
+            for facet, entries in self.options.items()
+        }
+
+    def counts(self, snapshot, filters: Optional[schemas.CityFilters]) -> dict:
+        if filters is None:
+            return {"total": self.size, "facets": self.unfiltered}
+
+        plan = compile_filters(filters, snapshot)
+        if not plan.predicates:
+            return {"total": self.size, "facets": self.unfiltered}
+        every_row = np.arange(self.size, dtype=np.intp)
+        masks = {predicate.name: predicate.test(every_row) for predicate in plan.predicates}
+
+        facet_names = set(FACET_PREDICATES.values())
+        base = np.ones(self.size, dtype=bool)
+        for name, mask in masks.items():
+            if name not in facet_names:
+                base &= mask
+
+        result = {}
+        for facet, own in FACET_PREDICATES.items():
+            conditioned = base.copy()
+            for name in facet_names:
+                if name != own and name in masks:
+                    conditioned &= masks[name]
+            rows = np.packbits(conditioned)
+            result[facet] = [
+                {**label, "count": int(np.bitwise_count(rows & bits).sum())}
+                for label, bits in self.options[facet]
+            ]
+
+        total = base
+        for name in facet_names:
+            if name in masks:
+                total = total & masks[name]
+        return {"total": int(total.sum()), "facets": result}
@@ -0,0 +1,238 @@
+"""In-process stand-in for ``bigquery.Client`` used by the benchmark suite.
+
+Holds seeded users, travel plans, preferences and cities in memory and
+answers the parameterized statements the repository and catalog send:
+``SELECT ... WHERE col = @param`` with keyset seeks, ``ORDER BY`` and
+``LIMIT``/``OFFSET``, ``UPDATE ... SET``, the preferences ``MERGE`` and
+streaming inserts. Every job sleeps for a configurable, seeded latency so
+results are repeatable between runs.
+"""
+import concurrent.futures
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud import bigquery
+from google.cloud.bigquery.table import Row
+
+from city_records import CITY_FIELDS
+
+SEED = 7
+BENCH_PASSWORD = "bench-password"
+VISA_TYPES = ("Visa free", "Visa on arrival", "Digital nomad visa", "eVisa")
+SEASONS = ("Hot", "Cool", "Dry", "Rainy")
+PLAN_JSON_FIELDS = ("date_range", "transportation", "accommodation", "budget")
+
+_TABLE = re.compile(r"`[^`]*\.(\w+)`")
+_EQUALS = re.compile(r"(?:WHERE|AND)\s+(\w+)\s*=\s*@(\w+)")
+_ORDER = re.compile(r"ORDER BY\s+(.+?)\s*(?:LIMIT|$)", re.S)
+_SET = re.compile(r"SET\s+(\w+)\s*=\s*@(\w+)")
+
+
+class FakeQueryJob:
+    def __init__(self, rows: List[Row], latency: float):
+        self._rows = rows
+        self._latency = latency
+        self.cancelled = False
+        self.cache_hit = False
+        self.total_bytes_processed = sum(len(json.dumps(list(row.values()), default=str)) for row in rows)
+        self.total_bytes_billed = max(self.total_bytes_processed, 10 * 1024 * 1024) if rows else 0
+
+    def result(self, timeout: Optional[float] = None, **kwargs):
+        if timeout is not None and self._latency > timeout:
+            time.sleep(timeout)
+            raise concurrent.futures.TimeoutError("Fake job exceeded its timeout")
+        time.sleep(self._latency)
+        return iter(self._rows)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def _as_rows(records: List[dict]) -> List[Row]:
+    if not records:
+        return []
+    index = {name: i for i, name in enumerate(records[0])}
+    return [Row(tuple(record.get(name) for name in index), index) for record in records]
+
+
+def _param_value(parameter):
+    if isinstance(parameter, bigquery.StructQueryParameter):
+        return dict(parameter.struct_values)
+    if isinstance(parameter, bigquery.ArrayQueryParameter):
+        return [_param_value(value) for value in parameter.values]
+    return parameter.value
+
+
+def _utc(value: datetime) -> datetime:
+    # TIMESTAMP columns and query parameters come back UTC-aware from the real client
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _sort_key(value):
+    # NULLs first, as BigQuery orders them ascending
+    return (value is not None, value)
+
+
+class FakeBigQueryClient:
+    """Deterministic in-memory warehouse answering the app's statement shapes.
+
+    ``latency`` is the mean seconds per job and ``jitter`` the +/- fraction
+    around it, drawn from a generator seeded with ``seed``.
+    """
+
+    def __init__(self, tables: Dict[str, List[dict]], latency: float = 0.0, jitter: float = 0.0, seed: int = SEED):
+        self.tables = {name: list(rows) for name, rows in tables.items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.queries = 0
+        self.inserted_rows = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _job_latency(self) -> float:
+        with self._lock:
+            self.queries += 1
+            spread = self._rng.uniform(-self.jitter, self.jitter)
+        return max(self.latency * (1 + spread), 0.0)
+
+    def query(self, query: str, job_config=None, **kwargs) -> FakeQueryJob:
+        params = {p.name: _param_value(p) for p in (job_config.query_parameters if job_config else [])}
+        table = _TABLE.search(query).group(1)
+        statement = query.lstrip().split(None, 1)[0].upper()
+        with self._lock:
+            if statement == "SELECT":
+                rows = self._select(table, query, params)
+            elif statement == "UPDATE":
+                rows = self._update(table, query, params)
+            elif statement == "MERGE":
+                rows = self._merge(table, params)
+            else:
+                raise ValueError(f"Unsupported statement: {statement}")
+        return FakeQueryJob(_as_rows(rows), self._job_latency())
+
+    def _select(self, table: str, query: str, params: dict) -> List[dict]:
+        rows = self.tables.get(table, [])
+        for column, name in _EQUALS.findall(query):
+            if not name.startswith("after_"):
+                rows = [row for row in rows if row.get(column) == params[name]]
+
+        order = _ORDER.search(query)
+        if order:
+            keys = []
+            for part in order.group(1).split(","):
+                column, *direction = part.split()
+                keys.append((column, bool(direction) and direction[0].upper() == "DESC"))
+            for column, descending in reversed(keys):
+                rows = sorted(rows, key=lambda row: _sort_key(row.get(column)), reverse=descending)
+            seek = tuple(params[f"after_{column}"] for column, _ in keys if f"after_{column}" in params)
+            if seek:
+                rows = [row for row in rows if self._after(row, keys[:len(seek)], seek)]
+
+        offset = params.get("skip", 0)
+        limit = params.get("limit")
+        return rows[offset:None if limit is None else offset + limit]
+
+    @staticmethod
+    def _after(row: dict, keys: List[Tuple[str, bool]], seek: tuple) -> bool:
+        for (column, descending), bound in zip(keys, seek):
+            value = row.get(column)
+            if value == bound:
+                continue
+            return value < bound if descending else value > bound
+        return False
+
+    def _update(self, table: str, query: str, params: dict) -> List[dict]:
+        column, name = _SET.search(query).groups()
+        where = _EQUALS.findall(query)
+        for row in self.tables.get(table, []):
+            if all(row.get(c) == params[n] for c, n in where):
+                row[column] = params[name]
+        return []
+
+    def _merge(self, table: str, params: dict) -> List[dict]:
+        rows = self.tables.setdefault(table, [])
+        by_user = {row["user_id"]: row for row in rows}
+        for source in params["rows"]:
+            if source["user_id"] in by_user:
+                by_user[source["user_id"]]["preferences"] = source["preferences"]
+            else:
+                rows.append(dict(source))
+        return []
+
+    def insert_rows_json(self, table: str, rows: List[dict], row_ids=None, **kwargs) -> list:
+        name = table.rsplit(".", 1)[-1]
+        time.sleep(self._job_latency())
+        with self._lock:
+            target = self.tables.setdefault(name, [])
+            for row in rows:
+                row = dict(row)
+                if name == "travel_plans":
+                    row["created_at"] = _utc(datetime.fromisoformat(row["created_at"]))
+                    for field in PLAN_JSON_FIELDS:
+                        row[field] = json.loads(row[field])
+                target.append(row)
+            self.inserted_rows += len(rows)
+        return []
+
+    def close(self):
+        pass
+
+
+# -----------------------
+# 🔹 Seeded data
+# -----------------------
+def seed_cities(count: int, rng: random.Random) -> List[dict]:
+    """Rows in the flat warehouse layout, numeric fields as strings like the live table."""
+    cities = []
+    for i in range(count):
+        city = {field: str(round(rng.uniform(1, 100), 1)) for field in CITY_FIELDS}
+        city.update(
+            id=f"city-{i:05d}",
+            name=f"City {i:05d}",
+            country=f"Country {i % 60:02d}",
+            lat=str(round(rng.uniform(-60, 70), 4)),
+            lng=str(round(rng.uniform(-180, 180), 4)),
+            averageTemperature=str(round(rng.uniform(-5, 32), 1)),
+            housing=str(rng.randint(300, 3000)),
+            food=str(rng.randint(150, 900)),
+            transportation=str(rng.randint(30, 300)),
+            entertainment=str(rng.randint(50, 500)),
+            averageWifiSpeed=str(rng.randint(5, 300)),
+            seasons=", ".join(sorted(rng.sample(SEASONS, rng.randint(1, 3)))),
+            visaRequirements=rng.choice(VISA_TYPES),
+        )
+        cities.append(city)
+    return cities
+
+
+def seed_tables(cities: int = 2000, users: int = 50, plans_per_user: int = 20, seed: int = SEED) -> Dict[str, List[dict]]:
+    """Deterministic tables; every user's password is BENCH_PASSWORD."""
+    from hashing import pwd_context
+
+    rng = random.Random(seed)
+    city_rows = seed_cities(cities, rng)
+    password_hash = pwd_context.hash(BENCH_PASSWORD)
+    user_rows, plan_rows = [], []
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(users):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        user_rows.append({"id": user_id, "email": f"bench{i:04d}@example.com", "password_hash": password_hash})
+        for j in range(plans_per_user):
+            start = started + timedelta(days=rng.randint(0, 365))
+            plan_rows.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": user_id,
+                "cities": [row["id"] for row in rng.sample(city_rows, 3)],
+                "date_range": {"start": start.date().isoformat(), "end": (start + timedelta(days=30)).date().isoformat()},
+                "transportation": ["flight"],
+                "accommodation": ["apartment"],
+                "budget": {"total": rng.randint(1000, 6000)},
+                "created_at": started + timedelta(minutes=i * plans_per_user + j),
+            })
+    return {"cities": city_rows, "users": user_rows, "travel_plans": plan_rows, "preferences": []}
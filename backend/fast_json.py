@@ -0,0 +1,35 @@
+from typing import Any, Iterable
+
+import orjson
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; pre-serialized bytes are sent untouched."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
+
+
+def with_field(fragment: bytes, name: str, value: Any) -> bytes:
+    """Append one top-level field to a serialized JSON object."""
+    return b"".join((fragment[:-1], b',"', name.encode(), b'":', dumps(value), b"}"))
+
+
+def cities_body(fragments: Iterable[bytes], **fields: Any) -> bytes:
+    """``{"cities": [...], **fields}`` with the array spliced from serialized city records."""
+    parts = [b'{"cities":[', b",".join(fragments), b"]"]
+    for name, value in fields.items():
+        parts += (b',"', name.encode(), b'":', dumps(value))
+    parts.append(b"}")
+    return b"".join(parts)
@@ -0,0 +1,180 @@
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+import schemas
+
+# Discover-page weather labels mapped onto average temperature bands (°C)
+WEATHER_BANDS = {
+    "Hot": (25.0, None),
+    "Moderate": (15.0, 25.0),
+    "Cool": (None, 15.0),
+}
+
+# Internet speed labels keyed by their leading word, as bands over averageWifiSpeed (Mbps)
+SPEED_BANDS = {
+    "Fast": (50.0, None),
+    "Medium": (20.0, 50.0),
+    "Basic": (None, 20.0),
+}
+
+
+class Predicate:
+    """One compiled filter condition over the catalog columns.
+
+    ``test`` receives candidate row indices and returns a boolean array of the
+    same length, so later predicates only look at rows earlier ones kept.
+    """
+
+    __slots__ = ("name", "test", "selectivity")
+
+    def __init__(self, name: str, test: Callable[[np.ndarray], np.ndarray], selectivity: float):
+        self.name = name
+        self.test = test
+        self.selectivity = selectivity
+
+
+class FilterPlan:
+    def __init__(self, snapshot, predicates: List[Predicate]):
+        self.snapshot = snapshot
+        # Most selective first: each step shrinks the candidate set for the next
+        self.predicates = sorted(predicates, key=lambda p: p.selectivity)
+
+    def rows(self) -> np.ndarray:
+        candidates = np.arange(self.snapshot.size, dtype=np.intp)
+        for predicate in self.predicates:
+            if candidates.size == 0:
+                break
+            candidates = candidates[predicate.test(candidates)]
+        return candidates
+
+    def mask(self) -> np.ndarray:
+        mask = np.zeros(self.snapshot.size, dtype=bool)
+        mask[self.rows()] = True
+        return mask
+
+
+# -----------------------
+# 🔹 PREDICATE BUILDERS
+# -----------------------
+def _range(snapshot, name: str, column: str, low: Optional[float], high: Optional[float]) -> Predicate:
+    values = snapshot.column(column)
+
+    def test(rows):
+        selected = values[rows]
+        keep = ~np.isnan(selected)
+        if low is not None:
+            keep &= selected >= low
+        if high is not None:
+            keep &= selected <= high
+        return keep
+
+    return Predicate(name, test, snapshot.estimate_range(column, low, high))
+
+
+def _bands(snapshot, name: str, column: str, bands: Sequence) -> Predicate:
+    """Union of half-open [low, high) bands over a numeric column."""
+    values = snapshot.column(column)
+
+    def test(rows):
+        selected = values[rows]
+        keep = np.zeros(selected.shape, dtype=bool)
+        for low, high in bands:
+            band = ~np.isnan(selected)
+            if low is not None:
+                band &= selected >= low
+            if high is not None:
+                band &= selected < high
+            keep |= band
+        return keep
+
+    estimate = sum(snapshot.estimate_range(column, low, high) for low, high in bands)
+    return Predicate(name, test, min(estimate, 1.0))
+
+
+def _visa_in(snapshot, visas: Sequence[str]) -> Predicate:
+    wanted = list(set(visas))
+
+    def test(rows):
+        return np.isin(snapshot.visas[rows], wanted)
+
+    estimate = sum(snapshot.visa_counts.get(v, 0) for v in wanted) / max(snapshot.size, 1)
+    return Predicate("visa", test, estimate)
+
+
+def _season_in(snapshot, seasons: Sequence[str]) -> Predicate:
+    combined = np.zeros(snapshot.size, dtype=bool)
+    for season in set(seasons):
+        season_mask = snapshot.season_masks.get(season)
+        if season_mask is not None:
+            combined |= season_mask
+
+    def test(rows):
+        return combined[rows]
+
+    return Predicate("seasons", test, float(combined.mean()) if snapshot.size else 0.0)
+
+
+# -----------------------
+# 🔹 COMPILER
+# -----------------------
+def compile_filters(filters: schemas.CityFilters, snapshot) -> FilterPlan:
+    predicates: List[Predicate] = []
+
+    def at_most(name, column, bound):
+        if bound is not None:
+            predicates.append(_range(snapshot, name, column, None, float(bound)))
+
+    def at_least(name, column, bound):
+        if bound is not None:
+            predicates.append(_range(snapshot, name, column, float(bound), None))
+
+    cost = filters.cost
+    if cost:
+        at_most("maxTotal", "totalCost", cost.maxTotal)
+        at_most("maxHousing", "housing", cost.maxHousing)
+        at_most("maxFood", "food", cost.maxFood)
+        at_most("maxTransportation", "transportation", cost.maxTransportation)
+        at_most("maxEntertainment", "entertainment", cost.maxEntertainment)
+
+    quality = filters.qualityOfLife
+    if quality:
+        at_least("minHealthcare", "healthcareIndex", quality.minHealthcare)
+        at_least("minSafety", "safetyIndex", quality.minSafety)
+        at_most("maxPollution", "pollutionIndex", quality.maxPollution)
+
+    climate = filters.climate
+    if climate:
+        temperature = climate.temperature
+        if temperature and (temperature.min is not None or temperature.max is not None):
+            predicates.append(_range(
+                snapshot, "temperature", "averageTemperature",
+                float(temperature.min) if temperature.min is not None else None,
+                float(temperature.max) if temperature.max is not None else None,
+            ))
+        at_most("maxPrecipitation", "precipitation", climate.maxPrecipitation)
+        weather = [WEATHER_BANDS[w] for w in climate.selectedWeather or [] if w in WEATHER_BANDS]
+        if weather:
+            predicates.append(_bands(snapshot, "weather", "averageTemperature", weather))
+        if climate.selectedSeasons:
+            predicates.append(_season_in(snapshot, climate.selectedSeasons))
+
+    infrastructure = filters.infrastructure
+    if infrastructure:
+        at_least("minWifiSpeed", "averageWifiSpeed", infrastructure.minWifiSpeed)
+        at_least("minCoworkingSpaces", "coworkingSpaces", infrastructure.minCoworkingSpaces)
+
+    nomad = filters.digitalNomad
+    if nomad:
+        at_least("minCommunitySize", "communitySize", nomad.minCommunitySize)
+        at_least("minMonthlyMeetups", "monthlyMeetups", nomad.minMonthlyMeetups)
+        if nomad.selectedVisas:
+            predicates.append(_visa_in(snapshot, nomad.selectedVisas))
+
+    internet = filters.internet
+    if internet and internet.selectedSpeeds:
+        speeds = [SPEED_BANDS[s.split(" ", 1)[0]] for s in internet.selectedSpeeds if s.split(" ", 1)[0] in SPEED_BANDS]
+        if speeds:
+            predicates.append(_bands(snapshot, "speed", "averageWifiSpeed", speeds))
+
+    return FilterPlan(snapshot, predicates)
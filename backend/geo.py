@@ -0,0 +1,172 @@
+import heapq
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 16
+# Below this many candidate rows a filtered query just measures every candidate
+BRUTE_FORCE_ROWS = 256
+
+
+def to_unit_vectors(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    lat_r = np.radians(lat)
+    lng_r = np.radians(lng)
+    cos_lat = np.cos(lat_r)
+    return np.column_stack((cos_lat * np.cos(lng_r), cos_lat * np.sin(lng_r), np.sin(lat_r)))
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+def km_to_chord(km: float) -> float:
+    return 2.0 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+class GeoIndex:
+    """Spatial index over the catalog's city coordinates.
+
+    Cities are placed on the unit sphere and stored in a KD-tree, so the
+    straight-line (chord) distance orders them exactly like great-circle
+    distance; k-nearest and radius queries prune whole subtrees. A copy of the
+    rows sorted by latitude answers map bounding boxes with two binary searches.
+    Rows without coordinates are left out.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray):
+        self.lat = lat
+        self.lng = lng
+        rows = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lng))
+        self.points = to_unit_vectors(lat, lng)
+
+        # Tree nodes as parallel lists; leaves own rows[start:end] of the permuted array
+        self._rows = rows.copy()
+        self._split_dim: List[int] = []
+        self._split_val: List[float] = []
+        self._children: List[Tuple[int, int]] = []
+        self._span: List[Tuple[int, int]] = []
+        if rows.size:
+            self._build(0, rows.size)
+
+        by_lat = rows[np.argsort(lat[rows], kind="stable")]
+        self._lat_rows = by_lat
+        self._lat_sorted = lat[by_lat]
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._span)
+        self._span.append((start, end))
+        self._split_dim.append(-1)
+        self._split_val.append(0.0)
+        self._children.append((-1, -1))
+        if end - start <= LEAF_SIZE:
+            return node
+
+        segment = self._rows[start:end]
+        coords = self.points[segment]
+        dim = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+        middle = (end - start) // 2
+        order = np.argpartition(coords[:, dim], middle)
+        self._rows[start:end] = segment[order]
+        split = float(self.points[self._rows[start + middle], dim])
+
+        left = self._build(start, start + middle)
+        right = self._build(start + middle, end)
+        self._split_dim[node] = dim
+        self._split_val[node] = split
+        self._children[node] = (left, right)
+        return node
+
+    # -----------------------
+    # 🔹 Queries
+    # -----------------------
+    def nearest(self, lat: float, lng: float, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The k closest rows (optionally restricted to ``mask``) and their distances in km."""
+        target = to_unit_vectors(np.array([lat]), np.array([lng]))[0]
+        candidates = self._small_candidate_set(mask)
+        if candidates is not None:
+            chords = np.linalg.norm(self.points[candidates] - target, axis=1)
+            take = np.argsort(chords, kind="stable")[:k]
+            return candidates[take], chord_to_km(chords[take])
+        if not self._span or k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-chord, row)
+        stack = [(0.0, 0)]
+        while stack:
+            bound, node = stack.pop()
+            if len(best) == k and bound > -best[0][0]:
+                continue
+            left, right = self._children[node]
+            if left < 0:
+                start, end = self._span[node]
+                rows = self._rows[start:end]
+                if mask is not None:
+                    rows = rows[mask[rows]]
+                chords = np.linalg.norm(self.points[rows] - target, axis=1)
+                for row, chord in zip(rows.tolist(), chords.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-chord, row))
+                    elif chord < -best[0][0]:
+                        heapq.heapreplace(best, (-chord, row))
+                continue
+            gap = target[self._split_dim[node]] - self._split_val[node]
+            near, far = (left, right) if gap < 0 else (right, left)
+            # Far side first on the stack so the near side is explored first
+            stack.append((max(bound, abs(gap)), far))
+            stack.append((bound, near))
+
+        best.sort(key=lambda item: -item[0])
+        rows = np.array([row for _, row in best], dtype=np.intp)
+        return rows, chord_to_km(np.array([-chord for chord, _ in best]))
+
+    def within(self, lat: float, lng: float, radius_km: float, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows within ``radius_km`` (great-circle), closest first, with their distances."""
+        target = to_unit_vectors(np.array([lat]), np.array([lng]))[0]
+        limit = km_to_chord(radius_km)
+        candidates = self._small_candidate_set(mask)
+        if candidates is None:
+            found = []
+            stack = [0] if self._span else []
+            while stack:
+                node = stack.pop()
+                left, right = self._children[node]
+                if left < 0:
+                    start, end = self._span[node]
+                    found.append(self._rows[start:end])
+                    continue
+                gap = target[self._split_dim[node]] - self._split_val[node]
+                if gap - limit <= 0:
+                    stack.append(left)
+                if gap + limit >= 0:
+                    stack.append(right)
+            candidates = np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+
+        chords = np.linalg.norm(self.points[candidates] - target, axis=1)
+        inside = chords <= limit
+        candidates, chords = candidates[inside], chords[inside]
+        order = np.argsort(chords, kind="stable")
+        return candidates[order], chord_to_km(chords[order])
+
+    def bounding_box(self, south: float, west: float, north: float, east: float, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows inside a map viewport; west > east means the box crosses the antimeridian."""
+        start = np.searchsorted(self._lat_sorted, south, side="left")
+        end = np.searchsorted(self._lat_sorted, north, side="right")
+        rows = self._lat_rows[start:end]
+        lng = self.lng[rows]
+        if west <= east:
+            inside = (lng >= west) & (lng <= east)
+        else:
+            inside = (lng >= west) | (lng <= east)
+        rows = rows[inside]
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows
+
+    def _small_candidate_set(self, mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if mask is None:
+            return None
+        candidates = np.flatnonzero(mask & ~np.isnan(self.lat) & ~np.isnan(self.lng))
+        return candidates if candidates.size <= BRUTE_FORCE_ROWS else None
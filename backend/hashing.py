@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from metrics import HASH_DURATION, HASH_QUEUE_WAIT
+
+# Changing the cost makes existing hashes "need update"; they are re-hashed on the next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashes running or queued in the pool at once; further callers wait for a slot
+HASH_MAX_IN_FLIGHT = HASH_WORKERS * 2
+HASH_QUEUE_TIMEOUT_SECONDS = 10.0
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+# -----------------------
+# 🔹 Worker functions (run in the pool)
+# -----------------------
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+# -----------------------
+# 🔹 Password hasher
+# -----------------------
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool so it never competes with request handling.
+
+    Callers block (in their worker thread, not on the event loop) until a slot
+    in the pool is free; waiting longer than the queue timeout raises HasherBusy.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_in_flight: int = HASH_MAX_IN_FLIGHT):
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn: workers import only this module instead of inheriting
+                    # a fork of the server with its threads and sockets
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._pool
+
+    def _run(self, fn, *args):
+        queued_at = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=HASH_QUEUE_TIMEOUT_SECONDS)
+        started_at = time.monotonic()
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                raise HasherBusy("Password hashing queue is full")
+            self.in_flight += 1
+            waited = started_at - queued_at
+            self.queue_seconds_total += waited
+            self.queue_seconds_max = max(self.queue_seconds_max, waited)
+        HASH_QUEUE_WAIT.observe(waited)
+
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            elapsed = time.monotonic() - started_at
+            HASH_DURATION.observe(elapsed, operation=fn.__name__.lstrip("_"))
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.hash_seconds_total += elapsed
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second item is a fresh hash when the stored one uses an outdated cost."""
+        return self._run(_verify_and_update, password, password_hash)
+
+    def warm_up(self):
+        """Start the worker processes ahead of the first login."""
+        pool = self._executor()
+        for future in [pool.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "waiting": self.waiting,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_seconds_total": self.queue_seconds_total,
+                "queue_seconds_max": self.queue_seconds_max,
+                "hash_seconds_total": self.hash_seconds_total,
+            }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
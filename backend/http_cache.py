@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Hashable, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+PAGE_CACHE_SIZE = 512
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _accepts(request: Request, encoding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class _Entry:
+    __slots__ = ("etag", "identity", "gzip", "br")
+
+    def __init__(self, etag: str, identity: bytes):
+        self.etag = etag
+        self.identity = identity
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+
+
+class CatalogPageCache:
+    """Conditional-GET support and serialized page cache for the catalog read routes.
+
+    The ETag is derived from the catalog fingerprint and the normalized query
+    string, so a client holding a current page gets a 304 without the page
+    being built at all. Built pages are kept serialized, with their gzip and
+    brotli forms compressed on first request, until the catalog changes.
+    """
+
+    def __init__(self, max_entries: int = PAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def respond(self, request: Request, snapshot, build: Callable[[], bytes]) -> Response:
+        """Answer from the cache, or with the JSON bytes ``build`` returns for this page."""
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        etag = f'W/"{snapshot.fingerprint[:16]}-{digest}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(snapshot.modified_at, usegmt=True),
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding, Authorization",
+        }
+
+        if self._not_modified(request, etag, snapshot.modified_at):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        with self._lock:
+            if self._fingerprint != snapshot.fingerprint:
+                self._fingerprint = snapshot.fingerprint
+                self._entries.clear()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            entry = _Entry(etag, build())
+            with self._lock:
+                if self._fingerprint == snapshot.fingerprint:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+        content = entry.identity
+        if len(content) >= MIN_COMPRESS_BYTES:
+            # Compressed forms are filled in once; a concurrent duplicate is harmless
+            if brotli is not None and _accepts(request, "br"):
+                if entry.br is None:
+                    entry.br = brotli.compress(entry.identity, quality=BROTLI_QUALITY)
+                content = entry.br
+                headers["Content-Encoding"] = "br"
+            elif _accepts(request, "gzip"):
+                if entry.gzip is None:
+                    entry.gzip = gzip.compress(entry.identity, compresslevel=GZIP_LEVEL, mtime=0)
+                content = entry.gzip
+                headers["Content-Encoding"] = "gzip"
+        return Response(content=content, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _not_modified(request: Request, etag: str, modified_at: float) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison: W/"x" and "x" name the same representation
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return int(modified_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "size": len(self._entries),
+            }
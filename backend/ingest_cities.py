@@ -0,0 +1,246 @@
+"""Bulk-load city data into a typed cities table.
+
+    python ingest_cities.py mock_data/cities.json extra.csv more.parquet
+    python ingest_cities.py cities.csv --dry-run
+
+Sources are CSV (the flat warehouse/export layout), JSON (the
+mock_data/cities.json shape, or a plain list of such objects) or Parquet.
+Rows are parsed and validated in worker processes, written to a staging table
+in batch load jobs and then copied over the target in one job, so readers see
+either the old table or the complete new one.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Set, Tuple
+
+from city_records import CITY_FIELDS, INTEGER_FIELDS, NUMERIC_FIELDS, TEXT_FIELDS, parse_float
+
+PARSE_CHUNK_ROWS = 2_000
+LOAD_BATCH_ROWS = 50_000
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+COST_FIELDS = ("housing", "food", "transportation", "entertainment")
+
+
+def _column(field: str) -> Tuple[str, str, str]:
+    if field in ("id", "name"):
+        return field, "STRING", "REQUIRED"
+    if field in TEXT_FIELDS:
+        return field, "STRING", "NULLABLE"
+    if field == "seasons":
+        return field, "STRING", "REPEATED"
+    return field, "INT64" if field in INTEGER_FIELDS else "FLOAT64", "NULLABLE"
+
+
+# (name, type, mode) of the typed table; location and totalCost are derived at load time
+TYPED_CITY_COLUMNS = tuple(_column(field) for field in CITY_FIELDS) + (
+    ("location", "GEOGRAPHY", "NULLABLE"),
+    ("totalCost", "FLOAT64", "NULLABLE"),
+)
+
+
+class IngestError(Exception):
+    pass
+
+
+# -----------------------
+# 🔹 Readers (main process)
+# -----------------------
+def _read_csv(path: str) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _read_json(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    yield from data["cities"] if isinstance(data, dict) else data
+
+
+def _read_parquet(path: str) -> Iterator[dict]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise IngestError("Reading Parquet needs pyarrow (pip install pyarrow)")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=PARSE_CHUNK_ROWS):
+        yield from batch.to_pylist()
+
+
+READERS = {".csv": _read_csv, ".json": _read_json, ".parquet": _read_parquet}
+
+
+def read_source(path: str) -> Iterator[dict]:
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise IngestError(f"Unsupported source {path}; expected one of {', '.join(READERS)}")
+    return reader(path)
+
+
+def chunked(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----------------------
+# 🔹 Normalization (worker processes)
+# -----------------------
+def _flatten(row: dict) -> dict:
+    if "metrics" not in row and "coordinates" not in row:
+        return row
+    flat = {"id": row.get("id"), "name": row.get("name"), "country": row.get("country")}
+    flat.update(row.get("coordinates") or {})
+    for group in (row.get("metrics") or {}).values():
+        flat.update(group)
+    return flat
+
+
+def _seasons(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            value = json.loads(value)
+        else:
+            return [s.strip() for s in value.split(",") if s.strip()]
+    return [str(s).strip() for s in value if str(s).strip()]
+
+
+def normalize_row(row: dict) -> dict:
+    """One source row as a typed table row; raises ValueError when it cannot be loaded."""
+    row = _flatten(row)
+    typed = {}
+    for field in CITY_FIELDS:
+        value = row.get(field)
+        if field in TEXT_FIELDS:
+            value = str(value).strip() if value is not None else None
+            typed[field] = value or None
+        elif field == "seasons":
+            typed[field] = _seasons(value)
+        else:
+            number = parse_float(value)
+            if number != number:
+                typed[field] = None
+            else:
+                typed[field] = int(number) if field in INTEGER_FIELDS else number
+
+    if not typed["id"] or not typed["name"]:
+        raise ValueError("id and name are required")
+    lat, lng = typed["lat"], typed["lng"]
+    if (lat is None) != (lng is None):
+        raise ValueError("lat and lng must be given together")
+    if lat is not None and not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(f"coordinates out of range: {lat}, {lng}")
+    for field in NUMERIC_FIELDS:
+        if field not in ("lat", "lng", "averageTemperature") and typed[field] is not None and typed[field] < 0:
+            raise ValueError(f"{field} must not be negative")
+
+    typed["location"] = f"POINT({lng} {lat})" if lat is not None else None
+    costs = [typed[field] for field in COST_FIELDS]
+    typed["totalCost"] = sum(costs) if None not in costs else None
+    return typed
+
+
+def normalize_chunk(source: str, start: int, rows: List[dict]) -> Tuple[List[dict], List[str]]:
+    typed, errors = [], []
+    for offset, row in enumerate(rows):
+        try:
+            typed.append(normalize_row(row))
+        except (ValueError, TypeError) as e:
+            errors.append(f"{source}: row {start + offset + 1}: {e}")
+    return typed, errors
+
+
+# -----------------------
+# 🔹 Pipeline
+# -----------------------
+def parse_sources(paths: List[str], workers: int = INGEST_WORKERS) -> Tuple[List[dict], List[str]]:
+    """Typed rows from every source (later duplicates of an id are reported and skipped)."""
+    rows: List[dict] = []
+    errors: List[str] = []
+    seen: Set[str] = set()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = []
+        for path in paths:
+            start = 0
+            for chunk in chunked(read_source(path), PARSE_CHUNK_ROWS):
+                futures.append(pool.submit(normalize_chunk, path, start, chunk))
+                start += len(chunk)
+        # Collected in submission order so the first occurrence of an id wins
+        for future in futures:
+            typed, chunk_errors = future.result()
+            errors.extend(chunk_errors)
+            for row in typed:
+                if row["id"] in seen:
+                    errors.append(f"duplicate id {row['id']} skipped")
+                    continue
+                seen.add(row["id"])
+                rows.append(row)
+    return rows, errors
+
+
+def load_rows(client, rows: List[dict], table: str, batch_rows: int = LOAD_BATCH_ROWS):
+    """Replace ``table`` with ``rows``: batch loads into a staging table, then one copy job."""
+    from google.cloud import bigquery
+
+    schema = [bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in TYPED_CITY_COLUMNS]
+    staging = f"{table}_staging"
+    for start in range(0, max(len(rows), 1), batch_rows):
+        job_config = bigquery.LoadJobConfig(
+            schema=schema,
+            write_disposition="WRITE_TRUNCATE" if start == 0 else "WRITE_APPEND",
+        )
+        client.load_table_from_json(rows[start:start + batch_rows], staging, job_config=job_config).result()
+        print(f"Loaded rows {start + 1}-{min(start + batch_rows, len(rows))} into {staging}")
+    client.copy_table(
+        staging, table, job_config=bigquery.CopyJobConfig(write_disposition="WRITE_TRUNCATE")
+    ).result()
+    client.delete_table(staging, not_found_ok=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-load city data into a typed cities table.")
+    parser.add_argument("sources", nargs="+", help="CSV, JSON or Parquet files")
+    parser.add_argument("--table", help="Target table (defaults to the app's cities table)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--batch-rows", type=int, default=LOAD_BATCH_ROWS)
+    parser.add_argument("--max-errors", type=int, default=0, help="Abort when more rows than this are rejected")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and validate only")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    try:
+        rows, errors = parse_sources(args.sources, args.workers)
+    except (IngestError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    for error in errors:
+        print(error, file=sys.stderr)
+    print(f"Parsed {len(rows)} cities ({len(errors)} rejected) in {time.monotonic() - started:.2f}s")
+    if len(errors) > args.max_errors:
+        print(f"Aborting: {len(errors)} rejected rows exceeds --max-errors {args.max_errors}", file=sys.stderr)
+        return 1
+    if args.dry_run:
+        return 0
+
+    from database import CITIES_TABLE, get_client
+    load_rows(get_client(), rows, args.table or CITIES_TABLE, args.batch_rows)
+    print(f"Loaded {len(rows)} cities into {args.table or CITIES_TABLE} in {time.monotonic() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
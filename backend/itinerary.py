@@ -0,0 +1,295 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from geo import chord_to_km
+
+# Largest plan solved exactly; Held-Karp is O(2^n * n^2)
+EXACT_MAX_CITIES = 12
+MAX_ITINERARY_CITIES = 200
+# Seconds of local search for plans too large to solve exactly
+SEARCH_TIME_BUDGET = 0.05
+# Longest run of consecutive cities Or-opt moves as one block
+OR_OPT_SEGMENT = 3
+# Random double-bridge restarts tried after the first local optimum, while budget remains
+SEARCH_KICKS = 8
+MATRIX_CACHE_SIZE = 256
+_EPSILON = 1e-7
+
+
+class InvalidItinerary(ValueError):
+    pass
+
+
+def _held_karp(dist: np.ndarray) -> List[int]:
+    """Shortest tour through every node, starting and ending at node 0 (exact)."""
+    n = len(dist) - 1
+    if n <= 1:
+        return list(range(n + 1))
+    inner = dist[1:, 1:]
+    full = 1 << n
+    bits = 1 << np.arange(n)
+    masks = np.arange(full)
+    sizes = np.zeros(full, dtype=np.intp)
+    for bit in bits:
+        sizes += (masks & bit) != 0
+
+    # cost[S, j]: shortest path from node 0 through the nodes in S, ending at j
+    cost = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.intp)
+    cost[bits, np.arange(n)] = dist[0, 1:]
+    for size in range(2, n + 1):
+        layer = masks[sizes == size]
+        for j in range(n):
+            subsets = layer[(layer & bits[j]) != 0]
+            # Nodes outside prev still cost inf, so they never win the argmin
+            totals = cost[subsets ^ bits[j]] + inner[:, j]
+            best = totals.argmin(axis=1)
+            cost[subsets, j] = totals[np.arange(subsets.size), best]
+            parent[subsets, j] = best
+
+    last = int(np.argmin(cost[full - 1] + dist[1:, 0]))
+    path = []
+    subset = full - 1
+    while last >= 0:
+        path.append(last + 1)
+        subset, last = subset ^ (1 << last), int(parent[subset, last])
+    return [0] + path[::-1]
+
+
+def _nearest_neighbour(dist: List[List[float]], first: List[int], last: List[int]) -> List[int]:
+    """Greedy tour from node 0; ``first``/``last`` are pinned right after and right before it."""
+    tour = [0] + first
+    remaining = set(range(1, len(dist))) - set(first) - set(last)
+    while remaining:
+        row = dist[tour[-1]]
+        nearest = min(remaining, key=row.__getitem__)
+        remaining.remove(nearest)
+        tour.append(nearest)
+    return tour + last
+
+
+def _tour_length(dist: List[List[float]], tour: List[int]) -> float:
+    return sum(dist[a][b] for a, b in zip(tour, tour[1:] + tour[:1]))
+
+
+def _two_opt(dist: List[List[float]], tour: List[int], deadline: float) -> bool:
+    """One improving pass of segment reversals; False once the deadline passes."""
+    m = len(tour)
+    for i in range(m - 2):
+        if time.perf_counter() > deadline:
+            return False
+        a, b = tour[i], tour[i + 1]
+        row_a, row_b = dist[a], dist[b]
+        ab = row_a[b]
+        for k in range(i + 2, m if i else m - 1):
+            c, d = tour[k], tour[(k + 1) % m]
+            if row_a[c] + row_b[d] - ab - dist[c][d] < -_EPSILON:
+                tour[i + 1:k + 1] = tour[i + 1:k + 1][::-1]
+                a, b = tour[i], tour[i + 1]
+                row_a, row_b = dist[a], dist[b]
+                ab = row_a[b]
+    return True
+
+
+def _or_opt(dist: List[List[float]], tour: List[int], deadline: float) -> bool:
+    """Move blocks of up to OR_OPT_SEGMENT cities to a cheaper place, possibly reversed.
+
+    Returns whether any block moved. Node 0 stays at the front of the tour.
+    """
+    moved = False
+    for length in range(1, OR_OPT_SEGMENT + 1):
+        i = 1
+        while i + length <= len(tour):
+            if time.perf_counter() > deadline:
+                return moved
+            m = len(tour)
+            head, tail = tour[i], tour[i + length - 1]
+            before, after = tour[i - 1], tour[(i + length) % m]
+            gain = dist[before][head] + dist[tail][after] - dist[before][after]
+            rest = tour[:i] + tour[i + length:]
+            best, best_at, best_reversed = _EPSILON, -1, False
+            for p in range(len(rest)):
+                x, y = rest[p], rest[(p + 1) % len(rest)]
+                if x == before:
+                    continue
+                forward = gain - (dist[x][head] + dist[tail][y] - dist[x][y])
+                backward = gain - (dist[x][tail] + dist[head][y] - dist[x][y])
+                if forward > best:
+                    best, best_at, best_reversed = forward, p, False
+                if backward > best:
+                    best, best_at, best_reversed = backward, p, True
+            if best_at < 0:
+                i += 1
+                continue
+            segment = tour[i:i + length]
+            if best_reversed:
+                segment.reverse()
+            tour[:] = rest[:best_at + 1] + segment + rest[best_at + 1:]
+            moved = True
+    return moved
+
+
+def _local_search(dist: List[List[float]], tour: List[int], deadline: float) -> bool:
+    """Alternate 2-opt and Or-opt until neither improves; returns whether that happened in time."""
+    while True:
+        before = _tour_length(dist, tour)
+        if not _two_opt(dist, tour, deadline):
+            return False
+        _or_opt(dist, tour, deadline)
+        if time.perf_counter() > deadline:
+            return False
+        if _tour_length(dist, tour) >= before - _EPSILON:
+            return True
+
+
+def _double_bridge(tour: List[int], rng: random.Random) -> List[int]:
+    """Reconnect three cut segments in a new order, keeping both edges at node 0."""
+    a, b, c = sorted(rng.sample(range(2, len(tour)), 3))
+    return tour[:a] + tour[b:c] + tour[a:b] + tour[c:]
+
+
+def _search(dist: List[List[float]], tour: List[int], budget: float, kicks: int) -> Tuple[List[int], bool]:
+    """Local search, then up to ``kicks`` perturbed restarts; the best tour and whether the first search finished."""
+    deadline = time.perf_counter() + budget
+    complete = _local_search(dist, tour, deadline)
+    best, best_length = tour, _tour_length(dist, tour)
+    # Seeded, so the same plan always gets the same answer
+    rng = random.Random(len(tour))
+    for _ in range(kicks if complete and len(tour) > 5 else 0):
+        candidate = _double_bridge(best, rng)
+        if not _local_search(dist, candidate, deadline):
+            break
+        length = _tour_length(dist, candidate)
+        if length < best_length - _EPSILON:
+            best, best_length = candidate, length
+    return best, complete
+
+
+class ItineraryPlanner:
+    """Orders a plan's cities into a short route by great-circle distance.
+
+    Open routes become tours through a virtual node at zero distance from
+    every city, with a fixed start or end tied to it by a large negative
+    cost, so one tour solver handles every case; a start equal to the end
+    is a round trip.
+
+    Plans of up to EXACT_MAX_CITIES are solved exactly with Held-Karp, larger
+    ones start from a nearest-neighbour route improved by 2-opt and Or-opt,
+    then by a few perturbed restarts, all within SEARCH_TIME_BUDGET. Distance
+    matrices are cached per catalog version and set of cities in a small LRU.
+    """
+
+    def __init__(self, max_entries: int = MATRIX_CACHE_SIZE, budget: float = SEARCH_TIME_BUDGET):
+        self.max_entries = max_entries
+        self.budget = budget
+        self._version: Optional[int] = None
+        self._matrices: "OrderedDict[Tuple[int, ...], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def optimize(self, snapshot, city_ids: List[str], start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+        ids = list(dict.fromkeys(city_ids))
+        if not ids:
+            raise InvalidItinerary("At least one city is required")
+        if len(ids) > MAX_ITINERARY_CITIES:
+            raise InvalidItinerary(f"At most {MAX_ITINERARY_CITIES} cities can be ordered")
+        for name, fixed in (("start", start), ("end", end)):
+            if fixed is not None and fixed not in ids:
+                raise InvalidItinerary(f"{name} must be one of the plan's cities")
+
+        rows = []
+        for city_id in ids:
+            i = snapshot.row_of(city_id)
+            if i is None:
+                raise InvalidItinerary(f"Unknown city: {city_id}")
+            rows.append(i)
+        km = self.matrix(snapshot, rows)
+        unplaced = np.isnan(np.diag(km))
+        if unplaced.any():
+            missing = [ids[i] for i in np.flatnonzero(unplaced)]
+            raise InvalidItinerary(f"Cities without coordinates: {', '.join(missing)}")
+
+        round_trip = start is not None and start == end
+        if round_trip:
+            # The start itself anchors the tour
+            anchor = ids.index(start)
+            nodes = [anchor] + [i for i in range(len(ids)) if i != anchor]
+            dist = km[np.ix_(nodes, nodes)]
+            first, last = [], []
+        else:
+            nodes = [-1] + list(range(len(ids)))
+            dist = np.zeros((len(ids) + 1, len(ids) + 1))
+            dist[1:, 1:] = km
+            first = [ids.index(start) + 1] if start is not None else []
+            last = [ids.index(end) + 1] if end is not None else []
+            # A bonus larger than any route keeps a fixed endpoint next to the virtual node
+            pinned = -(float(km.max()) * (len(ids) + 1) + 1.0)
+            for node in first + last:
+                dist[0, node] = dist[node, 0] = pinned
+
+        if len(ids) <= EXACT_MAX_CITIES:
+            tour, method, complete = _held_karp(dist), "exact", True
+        else:
+            table = dist.tolist()
+            tour, complete = _search(table, _nearest_neighbour(table, first, last), self.budget, SEARCH_KICKS)
+            method = "heuristic"
+
+        order = [nodes[node] for node in tour]
+        if not round_trip:
+            order = order[1:]
+            if (start is not None and ids[order[0]] != start) or (end is not None and ids[order[-1]] != end):
+                order.reverse()
+        legs = [(a, b) for a, b in zip(order, order[1:])]
+        if round_trip and len(order) > 1:
+            legs.append((order[-1], order[0]))
+        given = list(range(len(ids)))
+        return {
+            "cities": [ids[i] for i in order],
+            "legs": [{"from": ids[a], "to": ids[b], "distanceKm": round(float(km[a, b]), 1)} for a, b in legs],
+            "totalKm": round(float(sum(km[a, b] for a, b in legs)), 1),
+            "givenKm": round(float(km[given[:-1], given[1:]].sum() + (km[given[-1], 0] if round_trip else 0.0)), 1),
+            "roundTrip": round_trip,
+            "method": method,
+            "complete": complete,
+        }
+
+    def matrix(self, snapshot, rows: List[int]) -> np.ndarray:
+        """Great-circle km between ``rows``, in the given order; NaN where a city has no coordinates."""
+        key = tuple(sorted(rows))
+        with self._lock:
+            self._switch(snapshot.version)
+            cached = self._matrices.get(key)
+            if cached is not None:
+                self._matrices.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if cached is None:
+            points = snapshot.geo.points[list(key)]
+            chords = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+            cached = chord_to_km(chords)
+            with self._lock:
+                if self._version == snapshot.version:
+                    self._matrices[key] = cached
+                    while len(self._matrices) > self.max_entries:
+                        self._matrices.popitem(last=False)
+        position = {row: i for i, row in enumerate(key)}
+        order = [position[row] for row in rows]
+        return cached[np.ix_(order, order)]
+
+    def _switch(self, version: int):
+        # Caller holds the lock; a new catalog version invalidates every matrix
+        if self._version != version:
+            self._version = version
+            self._matrices.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._matrices)}
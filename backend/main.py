@@ -1,26 +1,113 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional
+import asyncio
 import jwt
 import json
-from google.cloud import bigquery
+import time
+import numpy as np
 import schemas
 import crud
 import os
+from admission import AdmissionController, AdmissionMiddleware
+from catalog import CatalogUnavailable, CityCatalog
+from dal import AsyncDataAccess
+from database import close_client, get_client
+from city_records import parse_float
+from filter_plan import compile_filters
+from pagination import CITY_CURSOR, PLAN_CURSOR, decode_cursor, encode_cursor
+from ranking import CityRanker, InvalidRanking
+from export import EXPORT_CHUNK_ROWS, EXPORT_FORMATS, city_chunks, plan_chunks
+from fast_json import FastJSONResponse, cities_body, with_field
+from hashing import HasherBusy
+from http_cache import CatalogPageCache
+from itinerary import InvalidItinerary, ItineraryPlanner
+from metrics import STARTUP_SECONDS, RequestTimer, registry
+from write_buffer import WriteBufferFull
+
+# Prime caches and start the bcrypt workers before serving (slower start, no slow first requests)
+STARTUP_WARM_UP = os.environ.get("STARTUP_WARM_UP", "0") == "1"
+
+# In-memory city catalog serving the read endpoints; the BigQuery client is built in the lifespan
+city_catalog = CityCatalog(get_client)
+city_ranker = CityRanker()
+itinerary_planner = ItineraryPlanner()
+# Serialized and compressed catalog pages, answered with 304 while the catalog is unchanged
+page_cache = CatalogPageCache()
+
+# Blocking warehouse calls from routes run through here, off the event loop
+data_access = AsyncDataAccess()
+
+
+def warm_up():
+    crud.password_hasher.warm_up()
+    city_ranker.warm_up(city_catalog.snapshot())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Requests are accepted once this returns, so each phase is timed and reported
+    started = time.perf_counter()
+    phases = {}
+
+    phase_started = time.perf_counter()
+    try:
+        # Credentials and the HTTP session, set up once for the whole process
+        await asyncio.to_thread(get_client)
+    except Exception as e:
+        print(f"Error creating BigQuery client: {e}")
+    phases["client"] = time.perf_counter() - phase_started
 
-# Get the absolute path of the JSON key file
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CREDENTIALS_PATH = os.path.join(BASE_DIR, "capstone-justus-51d7198c35df.json")
-
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = CREDENTIALS_PATH
-
-client = bigquery.Client()
+    phase_started = time.perf_counter()
+    try:
+        await asyncio.to_thread(city_catalog.refresh)
+    except Exception as e:
+        print(f"Error loading city catalog, serving mock data: {e}")
+        await asyncio.to_thread(city_catalog.load_fallback)
+    phases["catalog"] = time.perf_counter() - phase_started
+
+    if STARTUP_WARM_UP:
+        phase_started = time.perf_counter()
+        await asyncio.to_thread(warm_up)
+        phases["warm_up"] = time.perf_counter() - phase_started
+
+    phases["total"] = time.perf_counter() - started
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    print("Startup finished in " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items()))
+
+    refresher = asyncio.create_task(city_catalog.refresh_periodically())
+    yield
+    refresher.cancel()
+    data_access.shutdown()
+    # Push out every queued insert before the process goes away
+    await asyncio.to_thread(crud.close_storage)
+    close_client()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+def _request_user(scope: dict) -> Optional[str]:
+    """Subject of a valid bearer token; lets admission control rate limit per user before routing."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except jwt.PyJWTError:
+                return None
+    return None
+
+# Concurrency budgets per route class, so heavy routes queue or shed load instead of slowing everything
+admission = AdmissionController(identify=_request_user)
+# Innermost, so rejections still carry CORS headers
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # CORS middleware configuration
 app.add_middleware(
@@ -31,6 +118,8 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
     expose_headers=["*"]  # Expose all headers
 )
+# Outermost, so the recorded latency covers every other middleware
+app.add_middleware(RequestTimer)
 
 # Security configuration
 SECRET_KEY = "your-secret-key"  # In production, use a secure secret key
@@ -63,7 +152,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = crud.get_user_by_email(email)
+    # Active sessions are answered from the user cache without leaving the event loop
+    user = crud.user_cache.peek(("email", email))
+    if user is None:
+        user = await data_access.run("auth", crud.get_user_by_email, email)
     if user is None:
         raise credentials_exception
     return user
@@ -74,7 +166,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 # Note: Token endpoint is deliberately unprotected to allow users to authenticate
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = crud.authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await data_access.run("auth", crud.authenticate_user, form_data.username, form_data.password)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins in progress, try again shortly", headers={"Retry-After": "1"})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -89,11 +184,16 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 # -----------------------
 # Note: User registration endpoint is deliberately unprotected to allow new users to register
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate):
-    existing_user = crud.get_user_by_email(user.email)
+async def create_user(user: schemas.UserCreate):
+    existing_user = await data_access.run("users", crud.get_user_by_email, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(user)
+    try:
+        return await data_access.run("users", crud.create_user, user)
+    except WriteBufferFull:
+        raise HTTPException(status_code=503, detail="Too many pending signups, try again shortly", headers={"Retry-After": "2"})
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ups in progress, try again shortly", headers={"Retry-After": "1"})
 
 @app.get("/profile", response_model=schemas.User)
 async def get_profile(current_user: dict = Depends(get_current_user)):
@@ -101,299 +201,362 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
 
 @app.put("/profile/preferences", response_model=schemas.UserPreference)
 async def update_preferences(preferences: schemas.UserPreferenceBase, current_user: dict = Depends(get_current_user)):
-    return crud.update_user_preferences(current_user["id"], preferences)
+    # Submitting only queues the write, so the wait happens here rather than in a DAL slot
+    return await asyncio.wrap_future(crud.update_user_preferences(current_user["id"], preferences))
 
 # -----------------------
 # 🔹 City Routes
 # -----------------------
+MAX_BATCH_IDS = 100
+
+def _catalog_error(route: str, e: Exception) -> HTTPException:
+    """Map a failure in a catalog route to an HTTP error without leaking internals."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, CatalogUnavailable):
+        return HTTPException(status_code=503, detail=str(e))
+    print(f"Error in {route}: {e}")
+    return HTTPException(status_code=500, detail="Could not load cities")
+
 @app.get("/cities")
-async def get_cities(current_user: dict = Depends(get_current_user), limit: int = Query(50, ge=1, le=100), offset: int = Query(0, ge=0)):
+async def get_cities(request: Request, current_user: dict = Depends(get_current_user), limit: int = Query(50, ge=1, le=100), offset: int = Query(0, ge=0), cursor: Optional[str] = None, ids: Optional[str] = None):
+    after = decode_cursor(cursor, CITY_CURSOR)
+    requested = list(dict.fromkeys(i for i in ids.split(",") if i)) if ids else None
+    if requested is not None and len(requested) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
     try:
-        query = """
-            SELECT id, name, country, lat, lng, 
-                   averageTemperature, precipitation, seasons, 
-                   housing, food, transportation, entertainment, costOfLivingIndex, 
-                   averageWifiSpeed, coworkingSpaces, 
-                   healthcareIndex, safetyIndex, pollutionIndex, 
-                   communitySize, monthlyMeetups, visaRequirements
-            FROM `capstone-justus.digital_nomad.cities`
-            ORDER BY name
-            LIMIT @limit OFFSET @offset
-        """
-
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("limit", "INT64", limit),
-                bigquery.ScalarQueryParameter("offset", "INT64", offset),
-            ]
-        )
+        snapshot = city_catalog.snapshot()
 
-        # Print the query for debugging
-        print(f"Executing query: {query}")
-        print(f"With parameters: {job_config.query_parameters}")
+        def build():
+            if requested is not None:
+                # Batch lookup for comparisons: one hash probe per id
+                rows, missing = snapshot.get_many(requested)
+                return cities_body(snapshot.fragments_for(rows), missing=missing)
+            rows, next_key = snapshot.page_rows(limit=limit, offset=offset, after=after)
+            return cities_body(snapshot.fragments_for(rows), next_cursor=encode_cursor(next_key))
 
-        job = client.query(query, job_config=job_config)
-        results = job.result()
+        return page_cache.respond(request, snapshot, build)
+    except Exception as e:
+        raise _catalog_error("get_cities", e)
 
-        cities_list = []
-        for row in results:
-            try:
-                cities_list.append({
-                    "id": row["id"],
-                    "name": row["name"],
-                    "country": row["country"],
-                    "coordinates": {
-                        "lat": float(row["lat"]) if row["lat"] and row["lat"].strip() else None,
-                        "lng": float(row["lng"]) if row["lng"] and row["lng"].strip() else None
-                    },
-                    "metrics": {
-                        "climate": {
-                            "averageTemperature": int(float(row["averageTemperature"])) if row["averageTemperature"] and row["averageTemperature"].strip() else None,
-                            "precipitation": int(float(row["precipitation"])) if row["precipitation"] and row["precipitation"].strip() else None,
-                            "seasons": row["seasons"].split(", ") if row["seasons"] else []
-                        },
-                        "cost": {
-                            "housing": int(float(row["housing"])) if row["housing"] and row["housing"].strip() else None,
-                            "food": int(float(row["food"])) if row["food"] and row["food"].strip() else None,
-                            "transportation": int(float(row["transportation"])) if row["transportation"] and row["transportation"].strip() else None,
-                            "entertainment": int(float(row["entertainment"])) if row["entertainment"] and row["entertainment"].strip() else None,
-                            "costOfLivingIndex": int(float(row["costOfLivingIndex"])) if row["costOfLivingIndex"] and row["costOfLivingIndex"].strip() else None
-                        },
-                        "infrastructure": {
-                            "averageWifiSpeed": int(float(row["averageWifiSpeed"])) if row["averageWifiSpeed"] and row["averageWifiSpeed"].strip() else None,
-                            "coworkingSpaces": int(float(row["coworkingSpaces"])) if row["coworkingSpaces"] and row["coworkingSpaces"].strip() else None
-                        },
-                        "qualityOfLife": {
-                            "healthcareIndex": int(float(row["healthcareIndex"])) if row["healthcareIndex"] and row["healthcareIndex"].strip() else None,
-                            "safetyIndex": int(float(row["safetyIndex"])) if row["safetyIndex"] and row["safetyIndex"].strip() else None,
-                            "pollutionIndex": int(float(row["pollutionIndex"])) if row["pollutionIndex"] and row["pollutionIndex"].strip() else None
-                        },
-                        "digitalNomad": {
-                            "communitySize": int(float(row["communitySize"])) if row["communitySize"] and row["communitySize"].strip() else None,
-                            "monthlyMeetups": int(float(row["monthlyMeetups"])) if row["monthlyMeetups"] and row["monthlyMeetups"].strip() else None,
-                            "visaRequirements": row["visaRequirements"]
-                        }
-                    }
-                })
-            except Exception as e:
-                print(f"Error processing row {row}: {e}")
-        
-        return {"cities": cities_list if cities_list else []}  # Always return an array
+@app.post("/cities/search")
+async def search_cities(
+    filters: schemas.CityFilters,
+    current_user: dict = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
+):
+    """Apply the full Discover filter set in one pass over the city catalog."""
+    after = decode_cursor(cursor, CITY_CURSOR)
+    try:
+        snapshot = city_catalog.snapshot()
+        mask = compile_filters(filters, snapshot).mask()
+        rows, next_key = snapshot.page_rows(mask, limit=limit, offset=offset, after=after)
+        return FastJSONResponse(cities_body(
+            snapshot.fragments_for(rows), total=int(mask.sum()), next_cursor=encode_cursor(next_key)
+        ))
     except Exception as e:
-        print(f"Error in get_cities: {e}")
-        # Fallback to mock data
-        return {"cities": cities_data["cities"]}
+        raise _catalog_error("search_cities", e)
+
+@app.post("/cities/facets")
+async def city_facets(filters: Optional[schemas.CityFilters] = None, current_user: dict = Depends(get_current_user)):
+    """How many cities each sidebar option would match, given the other active filters."""
+    try:
+        snapshot = city_catalog.snapshot()
+        return snapshot.facets.counts(snapshot, filters)
+    except Exception as e:
+        raise _catalog_error("city_facets", e)
+
+@app.post("/cities/rank")
+async def rank_cities(
+    ranking: schemas.CityRanking,
+    current_user: dict = Depends(get_current_user),
+    k: int = Query(10, ge=1, le=100)
+):
+    """Top-k cities by a weighted score over normalized metrics."""
+    try:
+        snapshot = city_catalog.snapshot()
+        rows, scores, total = city_ranker.rank(snapshot, ranking, k)
+    except InvalidRanking as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise _catalog_error("rank_cities", e)
+    cities = [
+        with_field(snapshot.fragments[i], "score", round(score, 4))
+        for i, score in zip(rows.tolist(), scores.tolist())
+    ]
+    return FastJSONResponse(cities_body(cities, total=total))
+
+def _with_distances(snapshot, rows, distances) -> List[bytes]:
+    return [
+        with_field(snapshot.fragments[i], "distanceKm", round(distance, 1))
+        for i, distance in zip(rows.tolist(), distances.tolist())
+    ]
+
+def _filters_mask(filters: Optional[schemas.CityFilters], snapshot):
+    return compile_filters(filters, snapshot).mask() if filters is not None else None
+
+@app.post("/cities/nearest")
+async def nearest_cities(
+    filters: Optional[schemas.CityFilters] = None,
+    current_user: dict = Depends(get_current_user),
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=100)
+):
+    """The k cities closest to a point, optionally restricted by the Discover filters."""
+    try:
+        snapshot = city_catalog.snapshot()
+        rows, distances = snapshot.geo.nearest(lat, lng, k, _filters_mask(filters, snapshot))
+        return FastJSONResponse(cities_body(_with_distances(snapshot, rows, distances)))
+    except Exception as e:
+        raise _catalog_error("nearest_cities", e)
+
+@app.post("/cities/within")
+async def cities_within(
+    filters: Optional[schemas.CityFilters] = None,
+    current_user: dict = Depends(get_current_user),
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=20000),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Cities within a great-circle radius of a point, closest first."""
+    try:
+        snapshot = city_catalog.snapshot()
+        rows, distances = snapshot.geo.within(lat, lng, radius_km, _filters_mask(filters, snapshot))
+        page = slice(offset, offset + limit)
+        return FastJSONResponse(cities_body(_with_distances(snapshot, rows[page], distances[page]), total=int(rows.size)))
+    except Exception as e:
+        raise _catalog_error("cities_within", e)
+
+@app.post("/cities/in_bounds")
+async def cities_in_bounds(
+    filters: Optional[schemas.CityFilters] = None,
+    current_user: dict = Depends(get_current_user),
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
+):
+    """Cities inside the current map viewport; west > east crosses the antimeridian."""
+    after = decode_cursor(cursor, CITY_CURSOR)
+    try:
+        snapshot = city_catalog.snapshot()
+        mask = np.zeros(snapshot.size, dtype=bool)
+        mask[snapshot.geo.bounding_box(south, west, north, east, _filters_mask(filters, snapshot))] = True
+        rows, next_key = snapshot.page_rows(mask, limit=limit, offset=offset, after=after)
+        return FastJSONResponse(cities_body(
+            snapshot.fragments_for(rows), total=int(mask.sum()), next_cursor=encode_cursor(next_key)
+        ))
+    except Exception as e:
+        raise _catalog_error("cities_in_bounds", e)
+
+def _export_format(format: str) -> str:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return format
+
+@app.get("/cities/export")
+async def export_cities(current_user: dict = Depends(get_current_user), format: str = "ndjson"):
+    """The full catalog as NDJSON or CSV, streamed in chunks."""
+    fmt = _export_format(format)
+    try:
+        snapshot = city_catalog.snapshot()
+    except CatalogUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return StreamingResponse(
+        city_chunks(snapshot, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="cities.{fmt}"'},
+    )
 
 @app.get("/cities/{city_id}", response_model=schemas.City)
 async def get_city(city_id: str, current_user: dict = Depends(get_current_user)):
-    city = next((city for city in cities_data["cities"] if city["id"] == city_id), None)
-    if not city:
+    try:
+        snapshot = city_catalog.snapshot()
+    except CatalogUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    i = snapshot.row_of(city_id)
+    if i is None:
         raise HTTPException(status_code=404, detail="City not found")
-    return city
+    # Already in the schemas.City shape; the cached bytes skip validation and encoding
+    return FastJSONResponse(snapshot.fragments[i])
 
 # -----------------------
 # 🔹 Travel Plan Routes
 # -----------------------
 @app.post("/plans", response_model=schemas.TravelPlan)
 async def create_plan(plan: schemas.TravelPlanCreate, current_user: dict = Depends(get_current_user)):
-    return crud.create_user_travel_plan(plan, current_user["id"])
+    try:
+        return await data_access.run("plans", crud.create_user_travel_plan, plan, current_user["id"])
+    except WriteBufferFull:
+        raise HTTPException(status_code=503, detail="Too many pending plans, try again shortly", headers={"Retry-After": "2"})
 
-@app.get("/plans", response_model=List[schemas.TravelPlan])
-async def get_plans(current_user: dict = Depends(get_current_user), skip: int = 0, limit: int = 100):
-    return crud.get_user_travel_plans(current_user["id"], skip, limit)
+@app.post("/plans/optimize")
+async def optimize_plan(itinerary: schemas.ItineraryRequest, current_user: dict = Depends(get_current_user)):
+    """A short visiting order for a plan's cities by great-circle distance, optionally with a fixed start and end."""
+    try:
+        snapshot = city_catalog.snapshot()
+    except CatalogUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        # Up to the search budget of CPU, so it stays off the event loop
+        return await asyncio.to_thread(
+            itinerary_planner.optimize, snapshot, itinerary.cities, itinerary.start, itinerary.end
+        )
+    except InvalidItinerary as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+PLAN_FIELDS = tuple(schemas.TravelPlan.model_fields)
+
+@app.get("/plans", response_model=List[schemas.TravelPlan])
+async def get_plans(current_user: dict = Depends(get_current_user), skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    # The body stays a plain list; the cursor for the next page travels in a header
+    after = decode_cursor(cursor, PLAN_CURSOR)
+    plans, next_key = await data_access.run("plans", crud.get_user_travel_plans, current_user["id"], skip, limit, after)
+    headers = {"X-Next-Cursor": encode_cursor(next_key)} if next_key is not None else None
+    # Rows come from our own writes, so they are projected onto the schema instead of re-validated
+    return FastJSONResponse([{field: plan.get(field) for field in PLAN_FIELDS} for plan in plans], headers=headers)
+
+
+@app.get("/plans/export")
+async def export_plans(current_user: dict = Depends(get_current_user), format: str = "ndjson"):
+    """All of the user's plans as NDJSON or CSV, fetched and streamed one page at a time."""
+    fmt = _export_format(format)
+    user_id = current_user["id"]
+
+    def fetch_page(after):
+        return data_access.run("plans", crud.get_user_travel_plans, user_id, 0, EXPORT_CHUNK_ROWS, after)
+
+    return StreamingResponse(
+        plan_chunks(fetch_page, PLAN_FIELDS, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="plans.{fmt}"'},
+    )
 
 
 @app.get("/populate_cities")
-async def populate_cities(current_user: dict = Depends(get_current_user), limit: int = Query(50, ge=1, le=100), offset: int = Query(0, ge=0)):
+async def populate_cities(request: Request, current_user: dict = Depends(get_current_user), limit: int = Query(50, ge=1, le=100), offset: int = Query(0, ge=0), cursor: Optional[str] = None):
+    after = decode_cursor(cursor, CITY_CURSOR)
     try:
-        query = """
-            SELECT id, name, country, lat, lng, 
-                   averageTemperature, precipitation, seasons, 
-                   housing, food, transportation, entertainment, costOfLivingIndex, 
-                   averageWifiSpeed, coworkingSpaces, 
-                   healthcareIndex, safetyIndex, pollutionIndex, 
-                   communitySize, monthlyMeetups, visaRequirements
-            FROM `capstone-justus.digital_nomad.cities`
-            ORDER BY name
-            LIMIT @limit OFFSET @offset
-        """
-
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("limit", "INT64", limit),
-                bigquery.ScalarQueryParameter("offset", "INT64", offset),
-            ]
-        )
+        snapshot = city_catalog.snapshot()
 
-        # Print the query for debugging
-        print(f"Executing query: {query}")
-        print(f"With parameters: {job_config.query_parameters}")
+        def build():
+            rows, next_key = snapshot.page_rows(limit=limit, offset=offset, after=after)
+            return cities_body(snapshot.fragments_for(rows), next_cursor=encode_cursor(next_key))
 
-        job = client.query(query, job_config=job_config)
-        results = job.result()
-
-        cities_list = []
-        for row in results:
-            try:
-                cities_list.append({
-                    "id": row["id"],
-                    "name": row["name"],
-                    "country": row["country"],
-                    "coordinates": {
-                        "lat": float(row["lat"]) if row["lat"] and row["lat"].strip() else None,
-                        "lng": float(row["lng"]) if row["lng"] and row["lng"].strip() else None
-                    },
-                    "metrics": {
-                        "climate": {
-                            "averageTemperature": int(float(row["averageTemperature"])) if row["averageTemperature"] and row["averageTemperature"].strip() else None,
-                            "precipitation": int(float(row["precipitation"])) if row["precipitation"] and row["precipitation"].strip() else None,
-                            "seasons": row["seasons"].split(", ") if row["seasons"] else []
-                        },
-                        "cost": {
-                            "housing": int(float(row["housing"])) if row["housing"] and row["housing"].strip() else None,
-                            "food": int(float(row["food"])) if row["food"] and row["food"].strip() else None,
-                            "transportation": int(float(row["transportation"])) if row["transportation"] and row["transportation"].strip() else None,
-                            "entertainment": int(float(row["entertainment"])) if row["entertainment"] and row["entertainment"].strip() else None,
-                            "costOfLivingIndex": int(float(row["costOfLivingIndex"])) if row["costOfLivingIndex"] and row["costOfLivingIndex"].strip() else None
-                        },
-                        "infrastructure": {
-                            "averageWifiSpeed": int(float(row["averageWifiSpeed"])) if row["averageWifiSpeed"] and row["averageWifiSpeed"].strip() else None,
-                            "coworkingSpaces": int(float(row["coworkingSpaces"])) if row["coworkingSpaces"] and row["coworkingSpaces"].strip() else None
-                        },
-                        "qualityOfLife": {
-                            "healthcareIndex": int(float(row["healthcareIndex"])) if row["healthcareIndex"] and row["healthcareIndex"].strip() else None,
-                            "safetyIndex": int(float(row["safetyIndex"])) if row["safetyIndex"] and row["safetyIndex"].strip() else None,
-                            "pollutionIndex": int(float(row["pollutionIndex"])) if row["pollutionIndex"] and row["pollutionIndex"].strip() else None
-                        },
-                        "digitalNomad": {
-                            "communitySize": int(float(row["communitySize"])) if row["communitySize"] and row["communitySize"].strip() else None,
-                            "monthlyMeetups": int(float(row["monthlyMeetups"])) if row["monthlyMeetups"] and row["monthlyMeetups"].strip() else None,
-                            "visaRequirements": row["visaRequirements"]
-                        }
-                    }
-                })
-            except Exception as e:
-                print(f"Error processing row {row}: {e}")
-        
-        return {"cities": cities_list if cities_list else []}  # Always return an array
+        return page_cache.respond(request, snapshot, build)
     except Exception as e:
-        print(f"Error in populate_cities: {e}")
-        # Fallback to mock data
-        return {"cities": cities_data["cities"]}
+        raise _catalog_error("populate_cities", e)
 
 @app.get("/filter_cities")
 async def filter_cities(
+    request: Request,
     current_user: dict = Depends(get_current_user),
     min_temp: Optional[str] = None,  # Keep it as STRING
     max_temp: Optional[str] = None,
     max_cost: Optional[str] = None,
     visa_type: Optional[str] = None,
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
 ):
     """Get cities with filtering by query parameters."""
+    after = decode_cursor(cursor, CITY_CURSOR)
     try:
-        # Base query
-        base_query = """
-            SELECT id, name, country, lat, lng, 
-                   averageTemperature, precipitation, seasons, 
-                   housing, food, transportation, entertainment, costOfLivingIndex, 
-                   averageWifiSpeed, coworkingSpaces, 
-                   healthcareIndex, safetyIndex, pollutionIndex, 
-                   communitySize, monthlyMeetups, visaRequirements
-            FROM `capstone-justus.digital_nomad.cities`
-            WHERE 1=1
-        """
-        
-        query_params = [
-            bigquery.ScalarQueryParameter("limit", "INT64", limit),
-            bigquery.ScalarQueryParameter("offset", "INT64", offset),
-        ]
-        
-        # Apply filters with proper STRING casting
-        if min_temp is not None:
-            base_query += """
-                AND SAFE_CAST(NULLIF(averageTemperature, '') AS FLOAT64) IS NOT NULL
-                AND SAFE_CAST(NULLIF(averageTemperature, '') AS FLOAT64) >= SAFE_CAST(@min_temp AS FLOAT64)
-            """
-            query_params.append(bigquery.ScalarQueryParameter("min_temp", "STRING", min_temp))
-        
-        if max_temp is not None:
-            base_query += """
-                AND SAFE_CAST(NULLIF(averageTemperature, '') AS FLOAT64) IS NOT NULL
-                AND SAFE_CAST(NULLIF(averageTemperature, '') AS FLOAT64) <= SAFE_CAST(@max_temp AS FLOAT64)
-            """
-            query_params.append(bigquery.ScalarQueryParameter("max_temp", "STRING", max_temp))
-        
-        if max_cost is not None:
-            base_query += """
-                AND SAFE_CAST(NULLIF(housing, '') AS FLOAT64) IS NOT NULL
-                AND SAFE_CAST(NULLIF(food, '') AS FLOAT64) IS NOT NULL
-                AND (SAFE_CAST(NULLIF(housing, '') AS FLOAT64) + SAFE_CAST(NULLIF(food, '') AS FLOAT64)) <= SAFE_CAST(@max_cost AS FLOAT64)
-            """
-            query_params.append(bigquery.ScalarQueryParameter("max_cost", "STRING", max_cost))
-        
-        if visa_type is not None:
-            base_query += " AND visaRequirements = @visa_type"
-            query_params.append(bigquery.ScalarQueryParameter("visa_type", "STRING", visa_type))
-        
-        # Pagination and ordering
-        base_query += " ORDER BY name LIMIT @limit OFFSET @offset"
-        
-        # Execute query
-        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-        job = client.query(base_query, job_config=job_config)
-        results = job.result()
-
-        # Process results
-        cities_list = []
-        for row in results:
-            try:
-                cities_list.append({
-                    "id": row["id"],
-                    "name": row["name"],
-                    "country": row["country"],
-                    "coordinates": {
-                        "lat": float(row["lat"]) if row["lat"] and row["lat"].strip() else None,
-                        "lng": float(row["lng"]) if row["lng"] and row["lng"].strip() else None
-                    },
-                    "metrics": {
-                        "climate": {
-                            "averageTemperature": float(row["averageTemperature"]) if row["averageTemperature"] and row["averageTemperature"].strip() else None,
-                            "precipitation": float(row["precipitation"]) if row["precipitation"] and row["precipitation"].strip() else None,
-                            "seasons": row["seasons"].split(", ") if row["seasons"] else []
-                        },
-                        "cost": {
-                            "housing": float(row["housing"]) if row["housing"] and row["housing"].strip() else None,
-                            "food": float(row["food"]) if row["food"] and row["food"].strip() else None,
-                            "transportation": float(row["transportation"]) if row["transportation"] and row["transportation"].strip() else None,
-                            "entertainment": float(row["entertainment"]) if row["entertainment"] and row["entertainment"].strip() else None,
-                            "costOfLivingIndex": float(row["costOfLivingIndex"]) if row["costOfLivingIndex"] and row["costOfLivingIndex"].strip() else None
-                        },
-                        "infrastructure": {
-                            "averageWifiSpeed": float(row["averageWifiSpeed"]) if row["averageWifiSpeed"] and row["averageWifiSpeed"].strip() else None,
-                            "coworkingSpaces": int(row["coworkingSpaces"]) if row["coworkingSpaces"] and row["coworkingSpaces"].strip() else None
-                        },
-                        "qualityOfLife": {
-                            "healthcareIndex": float(row["healthcareIndex"]) if row["healthcareIndex"] and row["healthcareIndex"].strip() else None,
-                            "safetyIndex": float(row["safetyIndex"]) if row["safetyIndex"] and row["safetyIndex"].strip() else None,
-                            "pollutionIndex": float(row["pollutionIndex"]) if row["pollutionIndex"] and row["pollutionIndex"].strip() else None
-                        },
-                        "digitalNomad": {
-                            "communitySize": int(row["communitySize"]) if row["communitySize"] and row["communitySize"].strip() else None,
-                            "monthlyMeetups": int(row["monthlyMeetups"]) if row["monthlyMeetups"] and row["monthlyMeetups"].strip() else None,
-                            "visaRequirements": row["visaRequirements"]
-                        }
-                    }
-                })
-            except Exception as e:
-                print(f"Error processing row {row}: {e}")
-        
-        return {"cities": cities_list if cities_list else []}
+        snapshot = city_catalog.snapshot()
+
+        def build():
+            mask = snapshot.all_rows()
+
+            # Unparseable bounds become NaN and match nothing, like SAFE_CAST in the warehouse
+            if min_temp is not None or max_temp is not None:
+                mask &= snapshot.range_mask(
+                    snapshot.column("averageTemperature"),
+                    low=parse_float(min_temp) if min_temp is not None else None,
+                    high=parse_float(max_temp) if max_temp is not None else None,
+                )
+
+            if max_cost is not None:
+                housing_and_food = snapshot.column("housing") + snapshot.column("food")
+                mask &= snapshot.range_mask(housing_and_food, high=parse_float(max_cost))
+
+            if visa_type is not None:
+                mask &= snapshot.visas == visa_type
+
+            rows, next_key = snapshot.page_rows(mask, limit=limit, offset=offset, after=after)
+            return cities_body(snapshot.fragments_for(rows), next_cursor=encode_cursor(next_key))
+
+        return page_cache.respond(request, snapshot, build)
     except Exception as e:
-        print(f"Error in filter_cities: {e}")
-        return {"error": str(e)}
+        raise _catalog_error("filter_cities", e)
+
+
+# -----------------------
+# 🔹 Metrics
+# -----------------------
+# Component counters are read from their stats() only when /metrics is scraped
+def _labelled(stats: dict, label: str):
+    return [({label: key}, value) for key, value in stats.items()]
+
+registry.collect(
+    "nomad_executor_queue_depth", "gauge", "Warehouse calls waiting for an executor thread",
+    lambda: [({}, data_access.queue_depth())],
+)
+registry.collect(
+    "nomad_endpoint_waiting", "gauge", "Warehouse calls waiting for their endpoint group's slot",
+    lambda: _labelled(data_access.stats()["waiting"], "endpoint"),
+)
+registry.collect(
+    "nomad_endpoint_in_flight", "gauge", "Warehouse calls running, per endpoint group",
+    lambda: _labelled(data_access.stats()["in_flight"], "endpoint"),
+)
+registry.collect(
+    "nomad_password_hasher", "gauge", "Password hashing pool state",
+    lambda: _labelled({k: v for k, v in crud.password_hasher.stats().items() if k != "workers"}, "stat"),
+)
+registry.collect(
+    "nomad_cache_events_total", "counter", "Hits, misses and evictions of the in-process caches",
+    lambda: [
+        ({"cache": cache, "event": event}, value)
+        for cache, stats in (
+            ("users", crud.user_cache.stats()),
+            ("pages", page_cache.stats()),
+            ("ranking", city_ranker.stats()),
+            ("itinerary", itinerary_planner.stats()),
+            ("queries", crud.repository.stats().get("query_cache", {})),
+        )
+        for event, value in stats.items()
+        if event not in ("size", "entries", "bytes")
+    ],
+)
+registry.collect(
+    "nomad_pending_writes", "gauge", "Rows queued for the warehouse and not yet acknowledged",
+    lambda: _labelled(crud.repository.stats().get("pending_writes", {}), "table"),
+)
+registry.collect(
+    "nomad_admission_active", "gauge", "Requests running, per route class",
+    lambda: [({"route_class": name}, stats["active"]) for name, stats in admission.stats().items()],
+)
+registry.collect(
+    "nomad_admission_waiting", "gauge", "Requests queued for a slot, per route class",
+    lambda: [({"route_class": name}, stats["waiting"]) for name, stats in admission.stats().items()],
+)
+registry.collect(
+    "nomad_catalog_cities", "gauge", "Cities in the serving catalog snapshot",
+    lambda: [({}, city_catalog.snapshot().size)] if city_catalog.loaded else [],
+)
+
+# Note: Scrape endpoint is deliberately unprotected, like a Prometheus target on a private network
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 # -----------------------
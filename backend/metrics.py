@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers cache hits (sub-ms) through slow warehouse jobs
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+BYTES_BUCKETS = tuple(float(10 ** power) for power in range(3, 13))
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+def _copy(series: _Series) -> _Series:
+    copy = _Series(0)
+    copy.counts = list(series.counts)
+    copy.sum = series.sum
+    copy.count = series.count
+    return copy
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set; recording is a bisect and three adds under a lock."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, quantiles: Sequence[float] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.quantiles = tuple(quantiles)
+        self._series: Dict[Labels, _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = _labels(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets) + 1)
+            series.counts[slot] += 1
+            series.sum += value
+            series.count += 1
+
+    def quantile(self, q: float, series: _Series) -> float:
+        """Estimate from the buckets by linear interpolation, as histogram_quantile does."""
+        if series.count == 0:
+            return 0.0
+        rank = q * series.count
+        seen = 0
+        for i, count in enumerate(series.counts):
+            if seen + count >= rank and count:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, _copy(series)) for key, series in self._series.items()]
+        for key, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series.count}")
+        if self.quantiles and items:
+            name = f"{self.name}_quantile"
+            lines += [f"# HELP {name} {self.help} (estimated quantiles)", f"# TYPE {name} gauge"]
+            for key, series in sorted(items):
+                for q in self.quantiles:
+                    lines.append(f"{name}{_format_labels(key + (('quantile', str(q)),))} {_format_value(self.quantile(q, series))}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels: str):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Registry:
+    """Metrics plus collectors that read existing component stats only when scraped."""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = []
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, quantiles: Sequence[float] = ()) -> Histogram:
+        metric = Histogram(name, help, buckets, quantiles)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        metric = Gauge(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, name: str, kind: str, help: str, fn: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        """Register ``fn`` returning (labels, value) pairs for a gauge or counter read at scrape time."""
+        self._collectors.append((name, kind, help, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for name, kind, help, fn in self._collectors:
+            try:
+                samples = list(fn())
+            except Exception as e:
+                print(f"Error collecting {name}: {e}")
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_format_labels(_labels(labels))} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    "nomad_http_request_duration_seconds", "Time to handle a request, by route template", quantiles=QUANTILES
+)
+QUERY_DURATION = registry.histogram(
+    "nomad_bigquery_job_duration_seconds", "Wall time of BigQuery jobs, by query site", quantiles=QUANTILES
+)
+QUERY_BYTES_PROCESSED = registry.histogram(
+    "nomad_bigquery_bytes_processed", "Bytes processed per BigQuery job, by query site", buckets=BYTES_BUCKETS
+)
+QUERY_BYTES_BILLED = registry.counter("nomad_bigquery_bytes_billed_total", "Bytes billed by BigQuery jobs")
+QUERY_CACHE_HITS = registry.counter("nomad_bigquery_cache_hits_total", "BigQuery jobs answered from the warehouse result cache")
+QUERY_ROWS = registry.counter("nomad_bigquery_rows_total", "Rows returned by BigQuery jobs")
+QUERY_ERRORS = registry.counter("nomad_bigquery_errors_total", "BigQuery jobs that failed or timed out")
+HASH_DURATION = registry.histogram(
+    "nomad_password_hash_duration_seconds", "bcrypt work per call, excluding queue wait", quantiles=QUANTILES
+)
+HASH_QUEUE_WAIT = registry.histogram(
+    "nomad_password_hash_queue_seconds", "Time waiting for a free hashing slot", quantiles=QUANTILES
+)
+ADMISSION_REJECTIONS = registry.counter(
+    "nomad_admission_rejected_total", "Requests turned away by admission control, by route class and reason"
+)
+STARTUP_SECONDS = registry.gauge("nomad_startup_seconds", "Time spent in each startup phase before serving")
+
+
+def record_job(site: str, job, seconds: float, rows: Optional[int] = None):
+    """Record duration and statistics of a finished BigQuery job."""
+    QUERY_DURATION.observe(seconds, site=site)
+    processed = getattr(job, "total_bytes_processed", None)
+    if processed is not None:
+        QUERY_BYTES_PROCESSED.observe(float(processed), site=site)
+    billed = getattr(job, "total_bytes_billed", None)
+    if billed:
+        QUERY_BYTES_BILLED.inc(float(billed), site=site)
+    if getattr(job, "cache_hit", None):
+        QUERY_CACHE_HITS.inc(site=site)
+    if rows is not None:
+        QUERY_ROWS.inc(rows, site=site)
+
+
+class RequestTimer:
+    """ASGI middleware timing every HTTP request into REQUEST_LATENCY.
+
+    Requests are labelled by route template (``/cities/{city_id}``), not by raw
+    path, so the series count stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=str(status),
+            )
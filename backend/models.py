@@ -1,12 +1,12 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, JSON, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, JSON, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from .database import Base
+from database import Base
 
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(String(36), primary_key=True)
     email = Column(String, unique=True, index=True)
     full_name = Column(String)
     password_hash = Column(String)
@@ -20,7 +20,7 @@ class UserPreference(Base):
     __tablename__ = "user_preferences"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(String(36), ForeignKey("users.id"), unique=True)
     theme = Column(String, default="light")
     notifications = Column(Boolean, default=True)
     
@@ -28,9 +28,13 @@ class UserPreference(Base):
 
 class TravelPlan(Base):
     __tablename__ = "travel_plans"
+    __table_args__ = (
+        # Serves "plans for a user, newest first" without a sort
+        Index("ix_travel_plans_user_created", "user_id", "created_at", "id"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    id = Column(String(36), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id"))
     cities = Column(JSON)
     date_range = Column(JSON)
     transportation = Column(JSON)
@@ -38,4 +42,4 @@ class TravelPlan(Base):
     budget = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    user = relationship("User", back_populates="travel_plans")
\ No newline at end of file
+    user = relationship("User", back_populates="travel_plans")
@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence
+
+from fastapi import HTTPException
+
+
+def encode_cursor(key: Optional[Sequence[Any]]) -> Optional[str]:
+    """Opaque cursor for the sort key of the last row on a page (None when there is no next page)."""
+    if key is None:
+        return None
+    payload = json.dumps(list(key), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _text(value):
+    if value is not None and not isinstance(value, str):
+        raise TypeError("expected a string")
+
+
+def _row_id(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise TypeError("expected a string or integer id")
+
+
+def _timestamp(value):
+    datetime.fromisoformat(value)
+
+
+# Checks for each position of a sort key; they raise ValueError or TypeError on a bad value
+CITY_CURSOR = (_text, _text)  # (name, id)
+PLAN_CURSOR = (_timestamp, _row_id)  # (created_at, id)
+
+
+def decode_cursor(cursor: Optional[str], checks: Sequence[Callable[[Any], None]]) -> Optional[List[Any]]:
+    """The sort key in ``cursor``, with one value per check; anything else is a 400."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(key, list) or len(key) != len(checks):
+            raise ValueError("wrong key size")
+        for value, check in zip(key, checks):
+            check(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+PREFERENCE_COALESCE_SECONDS = 0.25
+PREFERENCE_MAX_BATCH = 500
+
+
+class _PendingPreferences:
+    __slots__ = ("preferences", "waiters")
+
+    def __init__(self, preferences: dict):
+        self.preferences = preferences
+        self.waiters: List[Future] = []
+
+
+class PreferenceCoalescer:
+    """Collects preference writes for a short window and stores them in one batch.
+
+    Successive updates from the same user inside the window overwrite each
+    other, so only the last state is written. Every caller gets a future that
+    resolves once the batch carrying its user's final state has been stored.
+    Batches are written one at a time, in the order they were collected.
+    """
+
+    def __init__(self, repository, window: float = PREFERENCE_COALESCE_SECONDS, max_batch: int = PREFERENCE_MAX_BATCH):
+        self._repository = repository
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, _PendingPreferences] = {}
+        self._lock = threading.Lock()
+        # Held across taking a batch and storing it, so a timer flush and close() never overlap
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+
+    def submit(self, user_id: str, preferences: dict) -> Future:
+        waiter = Future()
+        with self._lock:
+            self.submitted += 1
+            entry = self._pending.get(user_id)
+            if entry is None:
+                entry = self._pending[user_id] = _PendingPreferences(preferences)
+            else:
+                entry.preferences = preferences  # Last state wins
+            entry.waiters.append(waiter)
+
+            full = len(self._pending) >= self.max_batch
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return waiter
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not batch:
+                return
+
+            try:
+                self._repository.save_preferences_batch(
+                    {user_id: entry.preferences for user_id, entry in batch.items()}
+                )
+            except Exception as e:
+                for entry in batch.values():
+                    for waiter in entry.waiters:
+                        waiter.set_exception(e)
+                return
+
+            self.batches += 1
+            self.written += len(batch)
+        for entry in batch.values():
+            for waiter in entry.waiters:
+                waiter.set_result(entry.preferences)
+
+    def close(self):
+        self.flush()
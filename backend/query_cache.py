@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from singleflight import SingleFlight
+
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Seconds a result stays fresh, per query class; unlisted classes use the default
+QUERY_CACHE_TTLS = {
+    "user": 60.0,
+    "users": 30.0,
+    "plans": 300.0,
+}
+QUERY_CACHE_DEFAULT_TTL = 30.0
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def _estimate_bytes(rows: List[Any]) -> int:
+    # Serialized size as a stand-in for the footprint of the cached rows
+    return len(json.dumps([dict(row) for row in rows], default=str)) + 64
+
+
+class _Entry:
+    __slots__ = ("rows", "size", "tags", "expires_at")
+
+    def __init__(self, rows: List[Any], size: int, tags: Tuple[str, ...], expires_at: float):
+        self.rows = rows
+        self.size = size
+        self.tags = tags
+        self.expires_at = expires_at
+
+
+class QueryResultCache:
+    """Byte-bounded LRU of query results keyed on normalized SQL plus bound parameters.
+
+    A burst of identical misses runs the query once. Entries carry tags (e.g.
+    ``plans:<user_id>``); invalidating a tag drops its entries and stops any
+    fill that started before the invalidation from storing a stale result.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = QUERY_CACHE_MAX_BYTES,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = QUERY_CACHE_DEFAULT_TTL,
+    ):
+        self.max_bytes = max_bytes
+        self.ttls = dict(QUERY_CACHE_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._by_tag: Dict[str, Set[Hashable]] = {}
+        # Per tag with a fill in flight: invalidations seen, and how many fills are running
+        self._generations: Dict[str, int] = {}
+        self._filling: Dict[str, int] = {}
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get_or_run(
+        self,
+        query_class: str,
+        query: str,
+        params_key: str,
+        run: Callable[[], List[Any]],
+        tags: Iterable[str] = (),
+    ) -> List[Any]:
+        key = (query_class, normalize_sql(query), params_key)
+        tags = tuple(tags)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.rows
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+        return self._flight.do(key, lambda: self._fill(key, query_class, tags, run))
+
+    def _fill(self, key: Hashable, query_class: str, tags: Tuple[str, ...], run: Callable[[], List[Any]]) -> List[Any]:
+        with self._lock:
+            generations = [self._generations.get(tag, 0) for tag in tags]
+            for tag in tags:
+                self._filling[tag] = self._filling.get(tag, 0) + 1
+        try:
+            rows = run()
+            self._store(key, query_class, tags, generations, rows)
+        finally:
+            with self._lock:
+                for tag in tags:
+                    self._filling[tag] -= 1
+                    if not self._filling[tag]:
+                        # No fill left to protect; the tag's generation can go
+                        del self._filling[tag]
+                        self._generations.pop(tag, None)
+        return rows
+
+    def _store(self, key: Hashable, query_class: str, tags: Tuple[str, ...], generations: List[int], rows: List[Any]):
+        size = _estimate_bytes(rows)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttls.get(query_class, self.default_ttl)
+        with self._lock:
+            if [self._generations.get(tag, 0) for tag in tags] != generations:
+                return  # A write landed while the query ran
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(rows, size, tags, time.monotonic() + ttl)
+            self.bytes += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            for tag in tags:
+                if tag in self._filling:
+                    self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+            }
@@ -0,0 +1,174 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+import schemas
+from filter_plan import compile_filters
+
+# Metrics a ranking may weight, and whether a larger value is better
+RANKING_METRICS = {
+    "totalCost": False,
+    "housing": False,
+    "food": False,
+    "transportation": False,
+    "entertainment": False,
+    "costOfLivingIndex": False,
+    "averageWifiSpeed": True,
+    "coworkingSpaces": True,
+    "healthcareIndex": True,
+    "safetyIndex": True,
+    "pollutionIndex": False,
+    "communitySize": True,
+    "monthlyMeetups": True,
+    "averageTemperature": True,
+    "precipitation": False,
+}
+NORMALIZATIONS = ("minmax", "zscore", "rank")
+MISSING_POLICIES = ("worst", "mean", "exclude")
+RANKING_CACHE_SIZE = 256
+
+
+class InvalidRanking(ValueError):
+    pass
+
+
+def _normalize(values: np.ndarray, method: str) -> np.ndarray:
+    """Scale a column so that larger is better; NaN stays NaN."""
+    present = ~np.isnan(values)
+    out = np.full(values.shape, np.nan)
+    if not present.any():
+        return out
+    kept = values[present]
+    if method == "minmax":
+        low, high = kept.min(), kept.max()
+        out[present] = (kept - low) / (high - low) if high > low else 0.5
+    elif method == "zscore":
+        std = kept.std()
+        out[present] = (kept - kept.mean()) / std if std > 0 else 0.0
+    else:
+        # Percentile rank; ties share the rank of their first occurrence
+        ranks = np.searchsorted(np.sort(kept), kept, side="left")
+        out[present] = ranks / max(kept.size - 1, 1)
+    return out
+
+
+class CityRanker:
+    """Scores the catalog against a weight vector and keeps the best k.
+
+    Normalized columns are computed once per catalog version and reused by
+    every weight vector; finished rankings are cached per (version, weights,
+    missing-value policy, filters, k) in a small LRU.
+    """
+
+    def __init__(self, max_entries: int = RANKING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._version: Optional[int] = None
+        self._normalized: Dict[Tuple[str, str], np.ndarray] = {}
+        self._results: "OrderedDict[Hashable, Tuple[np.ndarray, np.ndarray, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rank(self, snapshot, ranking: schemas.CityRanking, k: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Row indices and scores of the top ``k`` cities, best first, plus how many were scored."""
+        weights = self._validate(ranking)
+        key = (
+            snapshot.version,
+            weights,
+            ranking.missing,
+            ranking.filters.model_dump_json(exclude_none=True) if ranking.filters else None,
+            k,
+        )
+        with self._lock:
+            self._switch(snapshot.version)
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        result = self._score(snapshot, weights, ranking, k)
+        with self._lock:
+            if self._version == snapshot.version:
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def warm_up(self, snapshot):
+        """Normalize every metric column of ``snapshot`` ahead of the first ranking request."""
+        with self._lock:
+            self._switch(snapshot.version)
+        for metric in RANKING_METRICS:
+            for method in NORMALIZATIONS:
+                self._column(snapshot, metric, method)
+
+    def _switch(self, version: int):
+        # Caller holds the lock; a new catalog version invalidates everything cached
+        if self._version != version:
+            self._version = version
+            self._normalized.clear()
+            self._results.clear()
+
+    def _validate(self, ranking: schemas.CityRanking) -> tuple:
+        if ranking.missing not in MISSING_POLICIES:
+            raise InvalidRanking(f"missing must be one of {', '.join(MISSING_POLICIES)}")
+        weights = []
+        for metric, spec in sorted(ranking.weights.items()):
+            if metric not in RANKING_METRICS:
+                raise InvalidRanking(f"Unknown ranking metric: {metric}")
+            if spec.normalization not in NORMALIZATIONS:
+                raise InvalidRanking(f"normalization must be one of {', '.join(NORMALIZATIONS)}")
+            if spec.weight:
+                weights.append((metric, float(spec.weight), spec.normalization))
+        if not weights:
+            raise InvalidRanking("At least one metric needs a non-zero weight")
+        return tuple(weights)
+
+    def _column(self, snapshot, metric: str, method: str) -> np.ndarray:
+        column = self._normalized.get((metric, method))
+        if column is None:
+            values = snapshot.column(metric)
+            column = _normalize(values if RANKING_METRICS[metric] else -values, method)
+            with self._lock:
+                if self._version == snapshot.version:
+                    self._normalized[(metric, method)] = column
+        return column
+
+    def _score(self, snapshot, weights: tuple, ranking: schemas.CityRanking, k: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        if ranking.filters is not None:
+            rows = compile_filters(ranking.filters, snapshot).rows()
+        else:
+            rows = np.arange(snapshot.size, dtype=np.intp)
+
+        scores = np.zeros(rows.size)
+        keep = np.ones(rows.size, dtype=bool)
+        total_weight = sum(abs(weight) for _, weight, _ in weights)
+        for metric, weight, method in weights:
+            column = self._column(snapshot, metric, method)
+            values = column[rows]
+            missing = np.isnan(values)
+            if missing.any():
+                if ranking.missing == "exclude":
+                    keep &= ~missing
+                    values = np.where(missing, 0.0, values)
+                else:
+                    present = column[~np.isnan(column)]
+                    fill = (present.min() if ranking.missing == "worst" else present.mean()) if present.size else 0.0
+                    values = np.where(missing, fill, values)
+            scores += (weight / total_weight) * values
+        rows, scores = rows[keep], scores[keep]
+
+        # Partial selection of the k best, then a sort of just those k
+        if k < rows.size:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        best = np.lexsort((rows, -scores))
+        return rows[best], scores[best], int(keep.sum())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._results)}
@@ -0,0 +1,83 @@
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Which storage engine backs crud: "bigquery" (default) or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "bigquery")
+
+Page = Tuple[list, Optional[tuple]]
+
+
+class Repository(ABC):
+    """Storage operations behind the crud API.
+
+    Rows come back as mappings supporting ``row["field"]``. List methods return
+    a page plus the sort key of its last row (None on the final page); passing
+    that key back as ``after`` continues from it.
+    """
+
+    @abstractmethod
+    def fetch_user(self, user_id: str):
+        ...
+
+    @abstractmethod
+    def fetch_user_by_email(self, email: str):
+        ...
+
+    @abstractmethod
+    def update_password_hash(self, user_id: str, password_hash: str):
+        ...
+
+    @abstractmethod
+    def list_users(self, skip: int, limit: int, after: Optional[Sequence] = None) -> Page:
+        ...
+
+    @abstractmethod
+    def add_user(self, row: dict):
+        ...
+
+    @abstractmethod
+    def list_travel_plans(self, user_id: str, skip: int, limit: int, after: Optional[Sequence] = None) -> Page:
+        ...
+
+    @abstractmethod
+    def add_travel_plan(self, row: dict):
+        ...
+
+    @abstractmethod
+    def save_preferences(self, user_id: str, preferences: dict):
+        ...
+
+    def save_preferences_batch(self, preferences_by_user: Dict[str, dict]):
+        for user_id, preferences in preferences_by_user.items():
+            self.save_preferences(user_id, preferences)
+
+    def stats(self) -> dict:
+        """Backend counters for monitoring."""
+        return {}
+
+    def close(self):
+        pass
+
+
+def keyset_page(rows: List, limit: int, key_fields: Tuple[str, ...]) -> Page:
+    """Trim the look-ahead row and return (page, sort key of the last row or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, tuple(
+        last[field].isoformat() if isinstance(last[field], datetime) else last[field]
+        for field in key_fields
+    )
+
+
+def create_repository(backend: str = STORAGE_BACKEND) -> Repository:
+    if backend == "bigquery":
+        from bigquery_repository import BigQueryRepository
+        return BigQueryRepository()
+    if backend == "sqlite":
+        from sqlite_repository import SQLiteRepository
+        return SQLiteRepository()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
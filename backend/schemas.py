@@ -27,8 +27,8 @@ class UserPreferenceBase(BaseModel):
     notifications: bool = True
 
 class UserPreference(UserPreferenceBase):
-    id: int
-    user_id: int
+    id: Optional[int] = None
+    user_id: str
 
     class Config:
         from_attributes = True
@@ -89,8 +89,8 @@ class TravelPlanCreate(TravelPlanBase):
     pass
 
 class TravelPlan(TravelPlanBase):
-    id: int
-    user_id: int
+    id: str
+    user_id: str
     created_at: datetime
 
     class Config:
@@ -137,4 +137,20 @@ class CityFilters(BaseModel):
     climate: Optional[ClimateFilters] = None
     infrastructure: Optional[InfrastructureFilters] = None
     digitalNomad: Optional[DigitalNomadFilters] = None
-    internet: Optional[InternetFilters] = None
\ No newline at end of file
+    internet: Optional[InternetFilters] = None
+
+# City ranking schemas
+class MetricWeight(BaseModel):
+    weight: float = 1.0
+    normalization: str = "minmax"  # minmax, zscore or rank
+
+class CityRanking(BaseModel):
+    weights: Dict[str, MetricWeight]
+    missing: str = "worst"  # worst, mean or exclude
+    filters: Optional[CityFilters] = None
+
+# Travel plan itinerary schemas
+class ItineraryRequest(BaseModel):
+    cities: List[str]
+    start: Optional[str] = None  # Same as end for a round trip
+    end: Optional[str] = None
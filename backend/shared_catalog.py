@@ -0,0 +1,143 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"NOMADCAT"
+ALIGNMENT = 64
+POINTER_NAME = "current.json"
+# Published files kept on disk; older ones are unlinked (workers that still map them are unaffected)
+KEEP_VERSIONS = 2
+
+Buffers = Dict[str, np.ndarray]
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_buffers(path: str, arrays: Buffers, meta: dict):
+    """Write ``arrays`` as 64-byte aligned column buffers after a JSON manifest.
+
+    Layout: MAGIC, manifest length (uint64, little-endian), manifest, padding,
+    then each array's raw bytes at the offset the manifest records for it.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+    manifest = json.dumps({"meta": meta, "arrays": layout}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(manifest))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(manifest)) + manifest)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def map_buffers(path: str) -> Tuple[Buffers, dict]:
+    """Map a file written by write_buffers read-only; arrays are views over the mapping."""
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a catalog file")
+    (length,) = struct.unpack_from("<Q", mapping, len(MAGIC))
+    start = len(MAGIC) + 8
+    manifest = json.loads(mapping[start:start + length])
+    data_start = _aligned(start + length)
+
+    arrays = {}
+    for name, spec in manifest["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        if count == 0:
+            arrays[name] = np.empty(spec["shape"], dtype=dtype)
+            continue
+        arrays[name] = np.frombuffer(
+            mapping, dtype=dtype, count=count, offset=data_start + spec["offset"]
+        ).reshape(spec["shape"])
+    return arrays, manifest["meta"]
+
+
+class SharedCatalogDirectory:
+    """Versioned catalog files shared by every worker process on a host.
+
+    A publisher writes ``catalog-<version>-<fingerprint>.bin`` next to the old
+    files and then atomically replaces ``current.json`` to point at it, so a
+    reader sees either the previous version or the complete new one. Readers
+    map the files read-only; the pages sit in the page cache once, however
+    many workers map them. Pointing the directory at a tmpfs such as /dev/shm
+    keeps them off disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Exclusive across processes, so one worker refreshes while the others wait for its result."""
+        with open(os.path.join(self.path, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def current(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path, POINTER_NAME), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def open(self, pointer: dict) -> Tuple[Buffers, dict]:
+        return map_buffers(os.path.join(self.path, pointer["file"]))
+
+    def publish(self, arrays: Buffers, meta: dict) -> dict:
+        name = f"catalog-{meta['version']:08d}-{meta['fingerprint'][:12]}.bin"
+        staging = os.path.join(self.path, f".{name}.{os.getpid()}")
+        write_buffers(staging, arrays, meta)
+        os.replace(staging, os.path.join(self.path, name))
+        pointer = {
+            "file": name,
+            "version": meta["version"],
+            "fingerprint": meta["fingerprint"],
+            "source": meta["source"],
+            "published_at": time.time(),
+        }
+        self._point(pointer)
+        self._prune(name)
+        return pointer
+
+    def touch(self, pointer: dict) -> dict:
+        """Re-point at the same file with a new publish time (the table was unchanged)."""
+        pointer = {**pointer, "published_at": time.time()}
+        self._point(pointer)
+        return pointer
+
+    def _point(self, pointer: dict):
+        staging = os.path.join(self.path, f".{POINTER_NAME}.{os.getpid()}")
+        with open(staging, "w", encoding="utf-8") as f:
+            json.dump(pointer, f)
+        os.replace(staging, os.path.join(self.path, POINTER_NAME))
+
+    def _prune(self, keep: str):
+        files = sorted(f for f in os.listdir(self.path) if f.startswith("catalog-") and f.endswith(".bin"))
+        for name in files[:-KEEP_VERSIONS]:
+            if name != keep:
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
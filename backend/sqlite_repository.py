@@ -0,0 +1,157 @@
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import and_, bindparam, create_engine, event, or_, select
+from sqlalchemy.dialects.sqlite import insert
+
+from database import Base, SQLITE_POOL_SIZE, SQLITE_URL
+from models import TravelPlan, User, UserPreference
+from repository import Page, Repository, keyset_page
+
+users = User.__table__
+plans = TravelPlan.__table__
+user_preferences = UserPreference.__table__
+
+# Statements are built once; SQLAlchemy reuses their compiled form and the
+# sqlite3 driver keeps the prepared statements cached per pooled connection.
+_user_by_id = select(users).where(users.c.id == bindparam("user_id")).limit(1)
+_user_by_email = select(users).where(users.c.email == bindparam("email")).limit(1)
+_users_page = (
+    select(users)
+    .order_by(users.c.email, users.c.id)
+    .limit(bindparam("limit"))
+    .offset(bindparam("skip"))
+)
+_users_after = (
+    select(users)
+    .where(or_(
+        users.c.email > bindparam("after_email"),
+        and_(users.c.email == bindparam("after_email"), users.c.id > bindparam("after_id")),
+    ))
+    .order_by(users.c.email, users.c.id)
+    .limit(bindparam("limit"))
+)
+_plans_page = (
+    select(plans)
+    .where(plans.c.user_id == bindparam("user_id"))
+    .order_by(plans.c.created_at.desc(), plans.c.id.desc())
+    .limit(bindparam("limit"))
+    .offset(bindparam("skip"))
+)
+_plans_after = (
+    select(plans)
+    .where(plans.c.user_id == bindparam("user_id"))
+    .where(or_(
+        plans.c.created_at < bindparam("after_created_at"),
+        and_(plans.c.created_at == bindparam("after_created_at"), plans.c.id < bindparam("after_id")),
+    ))
+    .order_by(plans.c.created_at.desc(), plans.c.id.desc())
+    .limit(bindparam("limit"))
+)
+_insert_user = users.insert()
+_update_password_hash = (
+    users.update()
+    .where(users.c.id == bindparam("user_id"))
+    .values(password_hash=bindparam("password_hash"))
+)
+_insert_plan = plans.insert()
+_upsert_preferences = insert(user_preferences)
+_upsert_preferences = _upsert_preferences.on_conflict_do_update(
+    index_elements=[user_preferences.c.user_id],
+    set_={
+        "theme": _upsert_preferences.excluded.theme,
+        "notifications": _upsert_preferences.excluded.notifications,
+    },
+)
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer commits
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+class SQLiteRepository(Repository):
+    """Local SQLAlchemy/SQLite storage for OLTP-style lookups (login, profile, plans)."""
+
+    def __init__(self, url: str = SQLITE_URL, pool_size: int = SQLITE_POOL_SIZE):
+        self.engine = create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=pool_size,
+            pool_pre_ping=False,
+            connect_args={"check_same_thread": False, "cached_statements": 256},
+        )
+        event.listen(self.engine, "connect", _configure_connection)
+        Base.metadata.create_all(self.engine)
+
+    def _all(self, statement, **params) -> list:
+        with self.engine.connect() as connection:
+            return [dict(row) for row in connection.execute(statement, params).mappings()]
+
+    def _one(self, statement, **params):
+        rows = self._all(statement, **params)
+        return rows[0] if rows else None
+
+    def _write(self, statement, **params):
+        with self.engine.begin() as connection:
+            connection.execute(statement, params)
+
+    # -----------------------
+    # 🔹 USERS
+    # -----------------------
+    def fetch_user(self, user_id: str):
+        return self._one(_user_by_id, user_id=user_id)
+
+    def fetch_user_by_email(self, email: str):
+        return self._one(_user_by_email, email=email)
+
+    def list_users(self, skip: int, limit: int, after: Optional[Sequence] = None) -> Page:
+        if after is not None:
+            rows = self._all(_users_after, after_email=after[0], after_id=after[1], limit=limit + 1)
+        else:
+            rows = self._all(_users_page, skip=skip, limit=limit + 1)
+        return keyset_page(rows, limit, ("email", "id"))
+
+    def add_user(self, row: dict):
+        self._write(_insert_user, **row)
+
+    def update_password_hash(self, user_id: str, password_hash: str):
+        self._write(_update_password_hash, user_id=user_id, password_hash=password_hash)
+
+    # -----------------------
+    # 🔹 TRAVEL PLANS
+    # -----------------------
+    def list_travel_plans(self, user_id: str, skip: int, limit: int, after: Optional[Sequence] = None) -> Page:
+        if after is not None:
+            rows = self._all(
+                _plans_after,
+                user_id=user_id,
+                after_created_at=datetime.fromisoformat(after[0]),
+                after_id=after[1],
+                limit=limit + 1,
+            )
+        else:
+            rows = self._all(_plans_page, user_id=user_id, skip=skip, limit=limit + 1)
+        return keyset_page(rows, limit, ("created_at", "id"))
+
+    def add_travel_plan(self, row: dict):
+        self._write(_insert_plan, **row)
+
+    # -----------------------
+    # 🔹 PREFERENCES
+    # -----------------------
+    def save_preferences(self, user_id: str, preferences: dict):
+        self._write(_upsert_preferences, user_id=user_id, **preferences)
+
+    def save_preferences_batch(self, preferences_by_user: Dict[str, dict]):
+        rows = [{"user_id": user_id, **preferences} for user_id, preferences in preferences_by_user.items()]
+        with self.engine.begin() as connection:
+            connection.execute(_upsert_preferences, rows)
+
+    def close(self):
+        self.engine.dispose()
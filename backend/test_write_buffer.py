@@ -0,0 +1,65 @@
+import os
+
+import write_buffer
+from write_buffer import MAX_INSERT_ATTEMPTS, WriteBehindBuffer
+
+
+class InsertAllClient:
+    """Answers insert_rows_json like BigQuery without skip_invalid_rows: one bad row stops the call."""
+
+    def __init__(self):
+        self.rows = []
+
+    def insert_rows_json(self, table, rows, row_ids=None, **kwargs):
+        bad = [i for i, row in enumerate(rows) if row.get("bad")]
+        if not bad:
+            self.rows.extend(rows)
+            return []
+        return [
+            {"index": i, "errors": [{"reason": "invalid" if i in bad else "stopped", "message": ""}]}
+            for i in range(len(rows))
+        ]
+
+
+def _buffer(tmp_path, client):
+    buffer = WriteBehindBuffer(lambda: client, "project.dataset.plans", log_path=os.path.join(tmp_path, "plans.log"))
+    # Flushed by hand below instead of by the background thread
+    buffer._thread = object()
+    return buffer
+
+
+def test_invalid_row_does_not_drop_the_rest_of_its_batch(tmp_path):
+    client = InsertAllClient()
+    buffer = _buffer(tmp_path, client)
+    for i in range(10):
+        buffer.append({"id": i, "bad": i == 3})
+
+    for _ in range(MAX_INSERT_ATTEMPTS + 1):
+        buffer.flush()
+
+    assert sorted(row["id"] for row in client.rows) == [i for i in range(10) if i != 3]
+    assert buffer.failed_rows == 1
+    assert buffer.pending == 0
+
+
+def test_transport_errors_cost_no_attempts(tmp_path, monkeypatch):
+    class Unreachable(InsertAllClient):
+        failures = MAX_INSERT_ATTEMPTS * 2
+
+        def insert_rows_json(self, table, rows, row_ids=None, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("warehouse unreachable")
+            return super().insert_rows_json(table, rows, row_ids, **kwargs)
+
+    monkeypatch.setattr(write_buffer, "RETRY_BACKOFF_SECONDS", 0.0)
+    client = Unreachable()
+    buffer = _buffer(tmp_path, client)
+    for i in range(3):
+        buffer.append({"id": i})
+
+    for _ in range(MAX_INSERT_ATTEMPTS * 2 + 1):
+        buffer.flush()
+
+    assert [row["id"] for row in client.rows] == [0, 1, 2]
+    assert buffer.failed_rows == 0
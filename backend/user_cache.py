@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from singleflight import SingleFlight
+
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL_SECONDS = 5 * 60
+
+
+def _keys(user: Any) -> Tuple[Hashable, Hashable]:
+    return ("email", user["email"]), ("id", user["id"])
+
+
+class UserCache:
+    """Bounded LRU + TTL cache for user rows, keyed by ("email", ...) or ("id", ...).
+
+    Concurrent misses for the same key are coalesced into a single lookup.
+    Only found users are cached so a fresh signup is never hidden by a stale miss,
+    and a lookup that overlaps an invalidation of the user is not cached at all.
+    """
+
+    def __init__(self, max_entries: int = USER_CACHE_SIZE, ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        # Keys invalidated while lookups are in flight, with the tick of their last invalidation
+        self._invalidated: Dict[Hashable, int] = {}
+        self._tick = 0
+        self._loading = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return user
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached user without counting a miss when absent."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user: Any):
+        with self._lock:
+            self._store(user)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        user = self.get(key)
+        if user is not None:
+            return user
+
+        def load():
+            with self._lock:
+                self._loading += 1
+                started = self._tick
+            try:
+                found = loader()
+                if found is not None:
+                    with self._lock:
+                        # Invalidated mid-lookup: the row may predate the write, so don't cache it
+                        if all(self._invalidated.get(k, 0) <= started for k in _keys(found)):
+                            self._store(found)
+                return found
+            finally:
+                with self._lock:
+                    self._loading -= 1
+                    if not self._loading:
+                        self._invalidated.clear()
+
+        return self._flight.do(key, load)
+
+    def invalidate(self, email: Optional[str] = None, user_id: Optional[str] = None):
+        with self._lock:
+            self._tick += 1
+            keys = [("email", email), ("id", user_id)]
+            for key in keys[:2]:
+                entry = self._entries.pop(key, None)
+                if entry is None:
+                    continue
+                # Drop the sibling key that points at the same user
+                for sibling in _keys(entry[0]):
+                    self._entries.pop(sibling, None)
+                    keys.append(sibling)
+            if self._loading:
+                for key in keys:
+                    self._invalidated[key] = self._tick
+
+    def _store(self, user: Any):
+        # Caller holds the lock
+        expires_at = time.monotonic() + self.ttl_seconds
+        for key in _keys(user):
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+WRITE_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".write_behind")
+
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL_SECONDS = 1.0
+MAX_PENDING_ROWS = 10_000
+BACKPRESSURE_TIMEOUT_SECONDS = 2.0
+MAX_INSERT_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 2.0
+MAX_RETRY_BACKOFF_SECONDS = 60.0
+# Rewrite the log down to the unacknowledged rows once it holds this many entries
+LOG_COMPACT_ENTRIES = 50_000
+
+
+class WriteBufferFull(Exception):
+    pass
+
+
+class WriteBehindBuffer:
+    """Accumulates streaming-insert rows for one table and sends them in batches.
+
+    ``append`` returns once the row is fsynced to a local append log, so it
+    survives a crash; a background thread flushes by size or time window via
+    ``insert_rows_json``. Rows rejected as invalid are retried with their
+    insert ids (letting BigQuery drop duplicates) until they succeed or run
+    out of attempts; rows BigQuery only stopped because another row in the
+    batch was invalid are retried without using an attempt. A call that fails
+    as a whole (network error, 5xx) costs no attempts either: the batch stays
+    queued and in the log, and is retried with exponential backoff for as
+    long as the warehouse is unreachable. Rows still in the log at startup
+    are re-queued.
+    """
+
+    def __init__(
+        self,
+        get_client: Callable,
+        table: str,
+        log_path: Optional[str] = None,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        max_pending: int = MAX_PENDING_ROWS,
+        on_flushed: Optional[Callable[[List[dict]], None]] = None,
+    ):
+        # A zero-argument callable returning the BigQuery client, resolved at flush time
+        self._get_client = get_client
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Called with the rows of each acknowledged batch, e.g. to invalidate cached reads
+        self.on_flushed = on_flushed
+        self.log_path = log_path or os.path.join(WRITE_LOG_DIR, f"{table.rsplit('.', 1)[-1]}.log")
+
+        # (insert_id, row, attempts)
+        self._pending: Deque[Tuple[str, dict, int]] = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._closing = threading.Event()
+        # Consecutive flushes that failed as a whole, for the retry backoff
+        self._failures = 0
+        self._thread: Optional[threading.Thread] = None
+        self._log = None
+        self._logged = 0
+
+        self.inserted_rows = 0
+        self.insert_calls = 0
+        self.failed_rows = 0
+
+        self._recover()
+        if self._pending:
+            self._ensure_started()
+
+    # -----------------------
+    # 🔹 Enqueue
+    # -----------------------
+    def append(self, row: dict) -> str:
+        insert_id = str(uuid.uuid4())
+        with self._not_full:
+            if not self._not_full.wait_for(
+                lambda: len(self._pending) < self.max_pending, timeout=BACKPRESSURE_TIMEOUT_SECONDS
+            ):
+                raise WriteBufferFull(f"Write buffer for {self.table} is full")
+            self._write_log({"insert_id": insert_id, "row": row})
+            self._pending.append((insert_id, row, 0))
+            pending = len(self._pending)
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wake.set()
+        return insert_id
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # -----------------------
+    # 🔹 Flush
+    # -----------------------
+    def flush(self) -> int:
+        """Send one batch; returns the number of rows acknowledged."""
+        with self._flush_lock:
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return 0
+
+            try:
+                self.insert_calls += 1
+                errors = self._get_client().insert_rows_json(
+                    self.table,
+                    [row for _, row, _ in batch],
+                    row_ids=[insert_id for insert_id, _, _ in batch],
+                )
+            except Exception as e:
+                self._failures += 1
+                print(f"Error flushing {len(batch)} rows to {self.table}: {e}")
+                self._requeue(batch, charge=False)
+                return 0
+
+            self._failures = 0
+            failed = {error["index"] for error in errors or []}
+            if failed:
+                print(f"Partial insert error for {self.table}: {errors}")
+                # One invalid row makes BigQuery refuse the whole call; the other rows come back
+                # as "stopped" and are retried free, only the invalid ones use up attempts
+                stopped = {
+                    error["index"] for error in errors
+                    if all(detail.get("reason") == "stopped" for detail in error.get("errors") or [{}])
+                }
+                self._requeue([batch[i] for i in sorted(stopped)], charge=False)
+                self._requeue([batch[i] for i in sorted(failed - stopped)])
+
+            self.inserted_rows += len(batch) - len(failed)
+            if self.on_flushed is not None and len(failed) < len(batch):
+                self.on_flushed([row for i, (_, row, _) in enumerate(batch) if i not in failed])
+            with self._lock:
+                if not self._pending:
+                    self._truncate_log()
+                elif self._logged >= LOG_COMPACT_ENTRIES:
+                    self._compact_log()
+                self._not_full.notify_all()
+            return len(batch) - len(failed)
+
+    def flush_all(self):
+        while self._pending:
+            before = len(self._pending)
+            self.flush()
+            if len(self._pending) >= before:
+                break  # Warehouse is refusing rows; they stay in the log for the next start
+
+    def close(self):
+        self._stopped = True
+        self._closing.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush_all()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _requeue(self, batch: List[Tuple[str, dict, int]], charge: bool = True):
+        # Only per-row rejections count as attempts; a failed call says nothing about the rows
+        with self._lock:
+            for insert_id, row, attempts in reversed(batch):
+                if not charge:
+                    self._pending.appendleft((insert_id, row, attempts))
+                    continue
+                if attempts + 1 >= MAX_INSERT_ATTEMPTS:
+                    self.failed_rows += 1
+                    print(f"Dropping row {insert_id} for {self.table} after {attempts + 1} attempts")
+                    continue
+                self._pending.appendleft((insert_id, row, attempts + 1))
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self._pending and not self._stopped:
+                if self.flush() == 0 and self._pending:
+                    self._closing.wait(self._backoff())
+                    break
+                if len(self._pending) < self.batch_size:
+                    break
+
+    def _backoff(self) -> float:
+        return min(RETRY_BACKOFF_SECONDS * 2 ** max(self._failures - 1, 0), MAX_RETRY_BACKOFF_SECONDS)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name=f"write-behind-{self.table}", daemon=True
+                    )
+                    self._thread.start()
+
+    # -----------------------
+    # 🔹 Append log
+    # -----------------------
+    def _write_log(self, entry: dict):
+        if self._log is None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            self._log = open(self.log_path, "a", encoding="utf-8")
+        self._log.write(json.dumps(entry, default=str) + "\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._logged += 1
+
+    def _truncate_log(self):
+        # Everything logged so far has been acknowledged by the warehouse
+        if self._log is not None:
+            self._log.truncate(0)
+            self._log.seek(0)
+        elif os.path.exists(self.log_path):
+            open(self.log_path, "w").close()
+        self._logged = 0
+
+    def _compact_log(self):
+        temp_path = self.log_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as temp:
+            for insert_id, row, _ in self._pending:
+                temp.write(json.dumps({"insert_id": insert_id, "row": row}, default=str) + "\n")
+            temp.flush()
+            os.fsync(temp.fileno())
+        if self._log is not None:
+            self._log.close()
+        os.replace(temp_path, self.log_path)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+        self._logged = len(self._pending)
+
+    def _recover(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from a crash mid-write
+                self._pending.append((entry["insert_id"], entry["row"], 0))
+        if self._pending:
+            print(f"Recovered {len(self._pending)} unflushed rows for {self.table}")
@@ -118,32 +118,15 @@ export const fetchCities = createAsyncThunk(
   }
 );
 
-// ✅ Fetch FILTERED cities (calls `/filter_cities` instead of `/cities`)
+// ✅ Fetch FILTERED cities (POSTs the filters to `/cities/search` instead of GET `/cities`)
 export const fetchFilteredCities = createAsyncThunk(
   'cities/fetchFilteredCities',
   async (filters: CitiesState['filters'], { rejectWithValue }) => {
     try {
       console.log('Sending filters to backend:', JSON.stringify(filters));
 
-      // ✅ Convert filters to query parameters (all as strings)
-      const params: Record<string, any> = {};
-      
-      if (filters.climate?.temperature?.min !== undefined) {
-        params.min_temp = String(filters.climate.temperature.min);
-      }
-      if (filters.climate?.temperature?.max !== undefined) {
-        params.max_temp = String(filters.climate.temperature.max);
-      }
-      if (filters.cost?.maxTotal !== undefined) {
-        params.max_cost = String(filters.cost.maxTotal);
-      }
-      if (filters.digitalNomad?.selectedVisas?.length > 0) {
-        params.visa_type = filters.digitalNomad.selectedVisas[0];
-      }
-
-      console.log('Query parameters:', params);
-
-      const response = await api.get('/filter_cities', { params });
+      // ✅ Send the whole filter set; the backend evaluates it in one pass
+      const response = await api.post('/cities/search', filters);
       console.log('Filter response:', response.data);
 
       if (response.data && response.data.cities) {